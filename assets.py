@@ -0,0 +1,239 @@
+import base64
+import hashlib
+import hmac
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from compression import PrecompressedStaticFiles
+
+STATIC_DIR = "static"
+FINGERPRINT_LENGTH = 12
+_FINGERPRINTED = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$" % FINGERPRINT_LENGTH)
+# Generated or temporary files that are never referenced by name
+GENERATED_SUFFIXES = (".gz", ".br", ".tmp")
+
+# Third-party assets served from static/vendor. The version is part of the
+# directory name, so these paths never change content and cache as immutable.
+# Run `python assets.py vendor` to download them; each download must match its
+# pinned hash in VENDOR_LOCK. The app does not start while one is missing,
+# unless STATIC_VENDOR_CDN_FALLBACK sends pages to the CDN instead.
+VENDOR_ASSETS = {
+    "vendor/bootstrap-5.1.3/css/bootstrap.min.css":
+        "https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css",
+    "vendor/bootstrap-5.1.3/js/bootstrap.bundle.min.js":
+        "https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js",
+    "vendor/fontawesome-6.0.0/css/all.min.css":
+        "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css",
+}
+for _font in ("fa-brands-400", "fa-regular-400", "fa-solid-900", "fa-v4compatibility"):
+    for _ext in (".woff2", ".ttf"):
+        VENDOR_ASSETS[f"vendor/fontawesome-6.0.0/webfonts/{_font}{_ext}"] = (
+            f"https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/webfonts/{_font}{_ext}"
+        )
+
+
+# "<path> <algorithm>-<base64 digest>" per vendored file, the subresource integrity
+# format the upstream projects publish; `python assets.py vendor --pin` records new ones
+VENDOR_LOCK = "vendor.lock"
+PIN_ALGORITHM = "sha384"
+
+
+def subresource_integrity(data: bytes, algorithm: str = PIN_ALGORITHM) -> str:
+    return f"{algorithm}-{base64.b64encode(hashlib.new(algorithm, data).digest()).decode()}"
+
+
+def read_vendor_lock(path: str = VENDOR_LOCK) -> Dict[str, str]:
+    pins: Dict[str, str] = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    asset, integrity = line.split()
+                    pins[asset] = integrity
+    return pins
+
+
+def write_vendor_lock(pins: Dict[str, str], path: str = VENDOR_LOCK):
+    with open(path, "w") as f:
+        f.write("# Pinned hashes of static/vendor files, checked by `python assets.py vendor`\n")
+        for asset in sorted(pins):
+            f.write(f"{asset} {pins[asset]}\n")
+
+
+def check_integrity(path: str, data: bytes, pins: Dict[str, str]):
+    """Raise unless data matches the pinned hash of a vendored path"""
+    expected = pins.get(path)
+    if expected is None:
+        raise RuntimeError(f"No pinned hash for {path} in {VENDOR_LOCK}; run `python assets.py vendor --pin` "
+                           f"on a trusted machine and review the lock file")
+    if not hmac.compare_digest(subresource_integrity(data, expected.split("-", 1)[0]), expected):
+        raise RuntimeError(f"{path} does not match its pinned hash in {VENDOR_LOCK}")
+
+
+def missing_vendor_assets() -> List[str]:
+    return [path for path in VENDOR_ASSETS if not os.path.exists(os.path.join(STATIC_DIR, path))]
+
+
+def fingerprinted_name(path: str, digest: str) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest}{ext}"
+
+
+class AssetManifest:
+    """Maps static file paths to content-hashed names and back.
+
+    Nothing is copied: `js/domains.js` is advertised as `js/domains.<hash>.js`
+    and the static mount strips the hash again when serving it. Hashes are
+    recomputed only when a file's mtime or size changes.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._entries: Dict[str, Tuple[float, int, str]] = {}  # path -> (mtime, size, fingerprinted name)
+
+    def _digest(self, full_path: str) -> str:
+        sha = hashlib.sha256()
+        with open(full_path, "rb") as f:
+            for block in iter(lambda: f.read(65536), b""):
+                sha.update(block)
+        return sha.hexdigest()[:FINGERPRINT_LENGTH]
+
+    def lookup(self, path: str) -> Optional[str]:
+        """Fingerprinted name for a static file, or None if it does not exist"""
+        path = path.lstrip("/")
+        if ".." in path.split("/"):
+            return None
+        full_path = os.path.join(self.directory, path)
+        entry = self._entries.get(path)
+        if entry is not None and not settings.TEMPLATE_AUTO_RELOAD:
+            return entry[2]
+        try:
+            stat_result = os.stat(full_path)
+        except OSError:
+            return None
+        if entry is not None and entry[:2] == (stat_result.st_mtime, stat_result.st_size):
+            return entry[2]
+        name = fingerprinted_name(path, self._digest(full_path))
+        self._entries[path] = (stat_result.st_mtime, stat_result.st_size, name)
+        return name
+
+    def resolve(self, name: str) -> Tuple[Optional[str], bool]:
+        """Split a fingerprinted name into (original path, hash is current).
+
+        Returns (None, False) for names that carry no fingerprint.
+        """
+        match = _FINGERPRINTED.match(name)
+        if not match:
+            return None, False
+        path = match["stem"] + match["ext"]
+        current = self.lookup(path)
+        if current is None:
+            return None, False
+        return path, current == name
+
+    def build(self) -> int:
+        """Fingerprint every static file up front (done once per worker at startup)"""
+        count = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if filename.endswith(GENERATED_SUFFIXES):
+                    continue
+                path = os.path.relpath(os.path.join(root, filename), self.directory).replace(os.sep, "/")
+                if self.lookup(path):
+                    count += 1
+        return count
+
+
+manifest = AssetManifest(STATIC_DIR)
+
+
+def asset_url(path: str) -> str:
+    """URL for a static asset with its content hash in the file name (Jinja global).
+
+    Vendored files that have not been downloaded fall back to their CDN URL
+    only with STATIC_VENDOR_CDN_FALLBACK.
+    """
+    name = manifest.lookup(path)
+    if name is not None:
+        return f"/static/{name}"
+    if path in VENDOR_ASSETS and settings.STATIC_VENDOR_CDN_FALLBACK:
+        return VENDOR_ASSETS[path]
+    return f"/static/{path}"
+
+
+class AssetStaticFiles(PrecompressedStaticFiles):
+    """Static mount that understands fingerprinted names.
+
+    Fingerprinted and versioned vendor paths are cached for a year as
+    immutable; plain paths must be revalidated (ETag) on every use.
+    """
+
+    async def get_response(self, path: str, scope):
+        path = path.replace(os.sep, "/")
+        immutable = path.startswith("vendor/")
+        original, current = manifest.resolve(path)
+        if original is not None:
+            # An outdated hash (page rendered before a deploy) still gets the current file, just not cached
+            path, immutable = original, current
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            if immutable:
+                response.headers["Cache-Control"] = f"public, max-age={settings.STATIC_MAX_AGE}, immutable"
+            else:
+                response.headers["Cache-Control"] = "no-cache"
+        return response
+
+
+def vendor_assets(force: bool = False, pin: bool = False) -> int:
+    """Download the third-party assets in VENDOR_ASSETS into static/vendor, checking their pinned hashes.
+
+    pin=True records the hashes of what was downloaded in VENDOR_LOCK instead
+    (to add or upgrade an asset); review and commit the lock file afterwards.
+    """
+    import httpx
+
+    pins = read_vendor_lock()
+    downloaded = 0
+    with httpx.Client(timeout=30, follow_redirects=True) as client:
+        for path, url in VENDOR_ASSETS.items():
+            target = os.path.join(STATIC_DIR, path)
+            if os.path.exists(target) and not force:
+                if not pin:
+                    with open(target, "rb") as f:
+                        check_integrity(path, f.read(), pins)
+                continue
+            response = client.get(url)
+            response.raise_for_status()
+            if pin:
+                pins[path] = subresource_integrity(response.content)
+            else:
+                check_integrity(path, response.content, pins)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target + ".tmp", "wb") as f:
+                f.write(response.content)
+            os.replace(target + ".tmp", target)
+            print(f"Downloaded {url} -> {target}")
+            downloaded += 1
+    if pin:
+        write_vendor_lock({path: integrity for path, integrity in pins.items() if path in VENDOR_ASSETS})
+    return downloaded
+
+
+if __name__ == "__main__":
+    # Build steps: python assets.py vendor         (download and verify third-party assets)
+    #              python assets.py vendor --pin   (download and record their hashes in vendor.lock)
+    #              python assets.py                (list fingerprinted names)
+    if sys.argv[1:2] == ["vendor"]:
+        try:
+            count = vendor_assets(force="--force" in sys.argv, pin="--pin" in sys.argv)
+        except RuntimeError as e:
+            sys.exit(f"ERROR: {e}")
+        print(f"Vendored {count} file(s)")
+    else:
+        manifest.build()
+        for path, (_, _, name) in sorted(manifest._entries.items()):
+            print(f"{path} -> {name}")
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from cache import domain_cache
+from config import settings
+
+# Per-item outcomes reported by the bulk engine
+CREATED = "created"
+EXISTS = "exists"
+DELETED = "deleted"
+UPDATED = "updated"
+FAILED = "failed"
+
+# Keep session-stored reports well under the browser cookie limit
+SESSION_REPORT_LIMIT = 25
+SESSION_ERROR_LENGTH = 80
+SESSION_ITEM_LENGTH = 120
+# JSON size cap of a report in the session; the cookie holds it base64-encoded (about 4/3 larger)
+# next to the flash messages, and browsers drop cookies over 4096 bytes
+SESSION_REPORT_BYTES = 2000
+
+
+def fit_session_report(report: Dict[str, Any], max_bytes: int = SESSION_REPORT_BYTES) -> Dict[str, Any]:
+    """Drop items from the end of a session report (counting them as hidden) until it fits max_bytes"""
+    items = report["items"]
+    while items and len(json.dumps(report)) > max_bytes:
+        items.pop()
+        report["hidden"] += 1
+    return report
+
+
+@dataclass
+class BulkItemResult:
+    item: str
+    status: str
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"item": self.item, "status": self.status, "error": self.error, "elapsed": round(self.elapsed, 3)}
+
+
+@dataclass
+class BulkResult:
+    action: str
+    items: List[BulkItemResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def count(self, status: str) -> int:
+        return sum(1 for item in self.items if item.status == status)
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        return counts
+
+    @property
+    def failed(self) -> List[BulkItemResult]:
+        return [item for item in self.items if item.status == FAILED]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "action": self.action,
+            "total": len(self.items),
+            "counts": self.counts,
+            "elapsed": round(self.elapsed, 3),
+            "items": [item.to_dict() for item in self.items],
+        }
+
+    def to_session(self, limit: int = SESSION_REPORT_LIMIT) -> Dict[str, Any]:
+        """Compact report for the session cookie: failures first, then the rest, capped in count and size"""
+        order = {FAILED: 0, EXISTS: 1}
+        ranked = sorted(self.items, key=lambda item: order.get(item.status, 2))
+        shown = [
+            {"item": item.item[:SESSION_ITEM_LENGTH], "status": item.status, "error": (item.error or "")[:SESSION_ERROR_LENGTH]}
+            for item in ranked[:limit]
+        ]
+        return fit_session_report({
+            "action": self.action,
+            "counts": self.counts,
+            "items": shown,
+            "hidden": max(0, len(self.items) - limit),
+        })
+
+
+_account_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def account_semaphore(api_key: str) -> asyncio.Semaphore:
+    """Worker-wide limit on in-flight upstream calls for one account"""
+    if api_key not in _account_semaphores:
+        _account_semaphores[api_key] = asyncio.Semaphore(max(1, settings.ACCOUNT_CONCURRENCY))
+    return _account_semaphores[api_key]
+
+
+Worker = Callable[[Any], Awaitable[Tuple[str, Optional[str]]]]
+
+
+async def run_bulk(
+    action: str,
+    items: Iterable[Any],
+    worker: Worker,
+    concurrency: Optional[int] = None,
+    label: Callable[[Any], str] = str,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> BulkResult:
+    """Run worker(item) for every item with at most `concurrency` calls in flight.
+
+    The worker returns a (status, error) tuple; exceptions are recorded as failures
+    so one bad item never aborts the batch. Results keep the input order. Pass a
+    shared `semaphore` to cap several batches together instead of each on its own.
+    """
+    items = list(items)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, concurrency or settings.BULK_CONCURRENCY))
+    started = time.monotonic()
+
+    async def run_one(item: Any) -> BulkItemResult:
+        async with semaphore:
+            item_started = time.monotonic()
+            try:
+                status, error = await worker(item)
+            except Exception as e:
+                status, error = FAILED, f"{type(e).__name__}: {e}"
+            return BulkItemResult(label(item), status, error, time.monotonic() - item_started)
+
+    results = await asyncio.gather(*(run_one(item) for item in items))
+    return BulkResult(action=action, items=list(results), elapsed=time.monotonic() - started)
+
+
+def unique_names(names: Iterable[str]) -> List[str]:
+    """Strip, drop blanks and de-duplicate (case-insensitively) while keeping order"""
+    seen = set()
+    result = []
+    for name in names:
+        name = name.strip()
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            result.append(name)
+    return result
+
+
+async def bulk_add_domains(dynu_api, domain_names: Iterable[str], concurrency: Optional[int] = None) -> BulkResult:
+    """Create many domains concurrently, skipping names the account already has"""
+    names = unique_names(domain_names)
+    # One listing call up front lets already-registered names skip an upstream POST each. It must be
+    # fresh from Dynu: a cached or mirrored list may still hold domains deleted there since. Without
+    # it every name is POSTed and Dynu's "already exists" answer is reported instead
+    domains = await dynu_api.fetch_domains()
+    if domains is not None:
+        domain_cache.put(dynu_api.api_key, domains)
+    existing = {(d.get("name") or "").lower() for d in domains or [] if isinstance(d, dict)}
+
+    async def add_one(name: str) -> Tuple[str, Optional[str]]:
+        if name.lower() in existing:
+            return EXISTS, "Domain already exists in this account"
+        return await dynu_api.create_domain(name)
+
+    return await run_bulk("add", names, add_one, concurrency)
+
+
+async def bulk_delete_domains(dynu_api, domain_ids: Iterable[int], concurrency: Optional[int] = None) -> BulkResult:
+    """Delete many domains concurrently, reporting each failure separately"""
+    ids = list(dict.fromkeys(domain_ids))
+
+    async def delete_one(domain_id: int) -> Tuple[str, Optional[str]]:
+        return await dynu_api.remove_domain(domain_id, update_cache=False)
+
+    result = await run_bulk("delete", ids, delete_one, concurrency, label=dynu_api.domain_name)
+    # Update the cached domain list once for the whole batch rather than per item
+    await dynu_api.forget_domains([domain_id for domain_id, item in zip(ids, result.items) if item.status == DELETED])
+    return result
+
+
+async def bulk_add_records(
+    dynu_api,
+    domain_ids: Iterable[int],
+    record_type: str,
+    name: str,
+    value: str,
+    priority: int = 10,
+    ttl: int = 3600,
+    state: bool = True,
+) -> BulkResult:
+    """Add the same DNS record to many domains under the account-wide concurrency cap"""
+    ids = list(dict.fromkeys(domain_ids))
+
+    async def add_one(domain_id: int) -> Tuple[str, Optional[str]]:
+        success, error = await dynu_api.add_dns_record(domain_id, record_type, name, value, priority, ttl, state=state)
+        return (CREATED, None) if success else (FAILED, error)
+
+    return await run_bulk(
+        f"add {record_type.upper()} record",
+        ids,
+        add_one,
+        label=dynu_api.domain_name,
+        semaphore=account_semaphore(dynu_api.api_key),
+    )
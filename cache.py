@@ -0,0 +1,234 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import settings
+from search_index import DomainSearchIndex, parse_sort
+
+
+def content_digest(data: Any) -> str:
+    """Stable digest of JSON-like data; equal content gives the same digest in every worker"""
+    raw = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+QUERY_CACHE_SIZE = 16
+
+
+class DomainListEntry:
+    """One account's domain list plus an id index, as last seen by this worker"""
+
+    def __init__(self, domains: List[dict], version: int):
+        self.domains = domains
+        self.by_id: Dict[int, dict] = {d.get("id"): d for d in domains if isinstance(d, dict)}
+        self.fetched_at = time.monotonic()
+        self.version = version
+        self._search_index: Optional[DomainSearchIndex] = None
+        self._search_index_version = -1
+        self._digest: Optional[str] = None
+        self._digest_version = -1
+        # Recent query results (positions), so paging through a filtered view is a slice
+        self._queries: "OrderedDict[tuple, List[int]]" = OrderedDict()
+        self._queries_version = -1
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    @property
+    def search_index(self) -> DomainSearchIndex:
+        """Search index for the current list, rebuilt lazily after any change"""
+        if self._search_index is None or self._search_index_version != self.version:
+            self._search_index = DomainSearchIndex(self.domains)
+            self._search_index_version = self.version
+        return self._search_index
+
+    @property
+    def digest(self) -> str:
+        """Content digest of the current list (for ETags), recomputed only after a change"""
+        if self._digest is None or self._digest_version != self.version:
+            self._digest = content_digest(self.domains)
+            self._digest_version = self.version
+        return self._digest
+
+    def search(self, query: str, mode: str = "contains") -> List[dict]:
+        return [self.domains[position] for position in self.search_index.search(query, mode)]
+
+    def query_positions(
+        self,
+        search: Optional[str] = None,
+        match: str = "contains",
+        filters: Optional[Dict[str, str]] = None,
+        sort: Optional[str] = None,
+    ) -> List[int]:
+        """Positions matching search + filters in sort order, memoized per list version"""
+        keys = parse_sort(sort)
+        filters = {k: v for k, v in (filters or {}).items() if v}
+        key = ((search or "").strip().lower(), match, tuple(sorted(filters.items())), keys)
+        if self._queries_version != self.version:
+            self._queries.clear()
+            self._queries_version = self.version
+        positions = self._queries.get(key)
+        if positions is None:
+            positions = self.search_index.query(search, match, filters, keys)
+            self._queries[key] = positions
+            if len(self._queries) > QUERY_CACHE_SIZE:
+                self._queries.popitem(last=False)
+        else:
+            self._queries.move_to_end(key)
+        return positions
+
+    def query(self, *args, **kwargs) -> List[dict]:
+        return [self.domains[position] for position in self.query_positions(*args, **kwargs)]
+
+
+class DomainCache:
+    """Per-account (API key) domain list cache with a TTL and write-through updates.
+
+    The cache is per worker process. Adds and deletes made through this worker
+    patch the cached list in place; changes made elsewhere show up once the TTL
+    expires. Every change bumps the account's version number.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, DomainListEntry] = {}
+        self._versions: Dict[str, int] = {}
+
+    def _bump(self, api_key: str) -> int:
+        self._versions[api_key] = self._versions.get(api_key, 0) + 1
+        return self._versions[api_key]
+
+    def version(self, api_key: str) -> int:
+        return self._versions.get(api_key, 0)
+
+    def get(self, api_key: str) -> Optional[DomainListEntry]:
+        """Fresh entry for the account, or None if missing or expired"""
+        entry = self._entries.get(api_key)
+        if entry is not None and entry.age() < self.ttl:
+            return entry
+        return None
+
+    def peek(self, api_key: str) -> Optional[DomainListEntry]:
+        """Entry for the account even if expired (for names and stale fallbacks)"""
+        return self._entries.get(api_key)
+
+    def put(self, api_key: str, domains: List[dict]) -> DomainListEntry:
+        entry = DomainListEntry(domains, self._bump(api_key))
+        self._entries[api_key] = entry
+        return entry
+
+    def add(self, api_key: str, domain: dict):
+        entry = self._entries.get(api_key)
+        if entry is None:
+            return
+        if domain.get("id") in entry.by_id:
+            return
+        entry.domains.append(domain)
+        entry.by_id[domain.get("id")] = domain
+        entry.version = self._bump(api_key)
+
+    def remove(self, api_key: str, domain_ids: Iterable[int]):
+        """Drop several domains in one pass over the cached list"""
+        entry = self._entries.get(api_key)
+        ids = set(domain_ids) & set(entry.by_id) if entry is not None else set()
+        if not ids:
+            return
+        entry.domains = [d for d in entry.domains if d.get("id") not in ids]
+        for domain_id in ids:
+            entry.by_id.pop(domain_id, None)
+        entry.version = self._bump(api_key)
+
+    def invalidate(self, api_key: str):
+        if self._entries.pop(api_key, None) is not None:
+            self._bump(api_key)
+
+
+class RecordSetEntry:
+    """DNS records of one domain as last seen by this worker"""
+
+    def __init__(self, records: List[dict], version: int):
+        self.records = records
+        self.fetched_at = time.monotonic()
+        self.version = version
+        self._digest: Optional[str] = None
+        self._digest_version = -1
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None or self._digest_version != self.version:
+            self._digest = content_digest(self.records)
+            self._digest_version = self.version
+        return self._digest
+
+
+class RecordCache:
+    """Per (account, domain) DNS record cache with targeted write-through updates.
+
+    Versions are tracked per account and domain, so a change to one zone never
+    invalidates the cached records of any other.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, int], RecordSetEntry] = {}
+        self._versions: Dict[Tuple[str, int], int] = {}
+
+    def _bump(self, key: Tuple[str, int]) -> int:
+        self._versions[key] = self._versions.get(key, 0) + 1
+        return self._versions[key]
+
+    def version(self, api_key: str, domain_id: int) -> int:
+        return self._versions.get((api_key, domain_id), 0)
+
+    def get(self, api_key: str, domain_id: int) -> Optional[RecordSetEntry]:
+        entry = self._entries.get((api_key, domain_id))
+        if entry is not None and entry.age() < self.ttl:
+            return entry
+        return None
+
+    def peek(self, api_key: str, domain_id: int) -> Optional[RecordSetEntry]:
+        return self._entries.get((api_key, domain_id))
+
+    def put(self, api_key: str, domain_id: int, records: List[dict]) -> RecordSetEntry:
+        key = (api_key, domain_id)
+        entry = RecordSetEntry(records, self._bump(key))
+        self._entries[key] = entry
+        return entry
+
+    def add(self, api_key: str, domain_id: int, record: dict):
+        key = (api_key, domain_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.records = entry.records + [record]
+        entry.version = self._bump(key)
+
+    def replace(self, api_key: str, domain_id: int, record: dict):
+        key = (api_key, domain_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.records = [record if r.get("id") == record.get("id") else r for r in entry.records]
+        entry.version = self._bump(key)
+
+    def remove(self, api_key: str, domain_id: int, record_id: int):
+        key = (api_key, domain_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.records = [r for r in entry.records if r.get("id") != record_id]
+        entry.version = self._bump(key)
+
+    def invalidate(self, api_key: str, domain_id: int):
+        key = (api_key, domain_id)
+        if self._entries.pop(key, None) is not None:
+            self._bump(key)
+
+
+domain_cache = DomainCache(ttl=settings.DOMAIN_CACHE_TTL)
+record_cache = RecordCache(ttl=settings.RECORD_CACHE_TTL)
@@ -0,0 +1,223 @@
+import gzip
+import os
+import zlib
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles
+
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip alone still covers every browser
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".html", ".json", ".txt", ".map", ".eot", ".ttf")
+# Preferred order when the client accepts several encodings
+STATIC_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(headers: Headers) -> List[str]:
+    """Encodings from Accept-Encoding that we can produce, best first (q=0 excluded)"""
+    accepted = set()
+    for part in headers.get("accept-encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(token.strip().lower())
+    encodings = []
+    if brotli is not None and "br" in accepted:
+        encodings.append("br")
+    if "gzip" in accepted:
+        encodings.append("gzip")
+    return encodings
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+class _Encoder:
+    """Incremental gzip/brotli compressor; flush() keeps streamed pages streaming"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._compressor.process(data)
+            return out + self._compressor.flush() if flush else out
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """Compress dynamic HTML/JSON responses with brotli or gzip.
+
+    Responses smaller than COMPRESSION_MIN_SIZE, non-text responses and ones
+    that already carry a Content-Encoding (precompressed static files) pass
+    through untouched. Streamed responses are compressed chunk by chunk and
+    flushed after every chunk, so streaming still reaches the browser early.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encodings = accepted_encodings(Headers(scope=scope))
+        if not encodings:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type", ""))
+                    or message["status"] in (204, 304)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message  # Held until we see the first body chunk
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                encoder = _Encoder(encodings[0])
+                headers["Content-Encoding"] = encoder.encoding
+                if more_body:
+                    del headers["Content-Length"]
+                    await send(start_message)
+                else:
+                    body = encoder.compress(body) + encoder.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+            if more_body:
+                chunk = encoder.compress(body, flush=True)
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": encoder.compress(body) + encoder.finish()})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves a `.br`/`.gz` sibling when the client accepts it.
+
+    The compressed copies are written by precompress_static(), so nothing is
+    compressed per request.
+    """
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse):
+            return response
+        for encoding in accepted_encodings(Headers(scope=scope)):
+            suffix = dict(STATIC_ENCODINGS)[encoding]
+            full_path, stat_result = self.lookup_path(path + suffix)
+            if stat_result is None:
+                continue
+            compressed = self.file_response(full_path, stat_result, scope)
+            if isinstance(compressed, FileResponse):
+                compressed.headers["Content-Type"] = response.headers["Content-Type"]
+                compressed.headers["Content-Encoding"] = encoding
+            compressed.headers["Vary"] = "Accept-Encoding"
+            return compressed
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+def _write_atomic(path: str, data: bytes, mtime: float):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.utime(tmp_path, (mtime, mtime))
+    os.replace(tmp_path, path)
+
+
+def precompress_static(directory: str = "static", minimum_size: Optional[int] = None) -> int:
+    """Write .gz (and .br when brotli is installed) copies of text assets.
+
+    Copies that are already up to date are skipped, so running this on every
+    worker start is cheap. Returns the number of files written.
+    """
+    minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+    written = 0
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            source = os.path.join(root, filename)
+            stat_result = os.stat(source)
+            if stat_result.st_size < minimum_size:
+                continue
+            data = None
+            for encoding, suffix in STATIC_ENCODINGS:
+                if encoding == "br" and brotli is None:
+                    continue
+                target = source + suffix
+                if os.path.exists(target) and os.stat(target).st_mtime == stat_result.st_mtime:
+                    continue
+                if data is None:
+                    with open(source, "rb") as f:
+                        data = f.read()
+                if encoding == "br":
+                    compressed = brotli.compress(data, quality=11)
+                else:
+                    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                try:
+                    _write_atomic(target, compressed, stat_result.st_mtime)
+                except OSError as e:
+                    print(f"WARNING: could not write {target} ({e})")
+                    continue
+                written += 1
+    return written
+
+
+if __name__ == "__main__":
+    # Build step: python compression.py
+    print(f"Precompressed {precompress_static()} static file(s)")
@@ -35,6 +35,83 @@ class Settings:
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
     
+    # Dynu upstream HTTP client (one keep-alive pool per worker)
+    DYNU_API_BASE_URL: str = os.getenv("DYNU_API_BASE_URL", "https://api.dynu.com/v2")
+    DYNU_MAX_CONNECTIONS: int = int(os.getenv("DYNU_MAX_CONNECTIONS", "100"))
+    DYNU_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("DYNU_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    DYNU_KEEPALIVE_EXPIRY: float = float(os.getenv("DYNU_KEEPALIVE_EXPIRY", "30"))
+    DYNU_CONNECT_TIMEOUT: float = float(os.getenv("DYNU_CONNECT_TIMEOUT", "5"))
+    DYNU_TIMEOUT: float = float(os.getenv("DYNU_TIMEOUT", "20"))
+    
+    # Bulk operations: max upstream calls in flight per bulk request
+    BULK_CONCURRENCY: int = int(os.getenv("BULK_CONCURRENCY", "10"))
+    # Cap shared by every concurrent bulk record job of the same account within a worker
+    ACCOUNT_CONCURRENCY: int = int(os.getenv("ACCOUNT_CONCURRENCY", "10"))
+    
+    # Upstream rate limit per Dynu API key, shared by all workers on the host via SQLite
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+    RATE_LIMIT_PER_SECOND: float = float(os.getenv("RATE_LIMIT_PER_SECOND", "10"))
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "20"))
+    RATE_LIMIT_DB: str = os.getenv("RATE_LIMIT_DB", "./rate_limit.db")
+    
+    # Upstream retries (exponential backoff with jitter, honouring Retry-After)
+    RETRY_MAX_ATTEMPTS: int = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+    RETRY_BASE_DELAY: float = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+    RETRY_MAX_DELAY: float = float(os.getenv("RETRY_MAX_DELAY", "10"))
+    
+    # Per-account domain list cache (seconds); adds/deletes made here update it directly
+    DOMAIN_CACHE_TTL: float = float(os.getenv("DOMAIN_CACHE_TTL", "60"))
+    # Per-domain DNS record cache (seconds); record adds/deletes made here patch it in place
+    RECORD_CACHE_TTL: float = float(os.getenv("RECORD_CACHE_TTL", "300"))
+    
+    # Local SQL mirror of domains and records: reads use it while younger than MIRROR_MAX_AGE (seconds)
+    MIRROR_ENABLED: bool = os.getenv("MIRROR_ENABLED", "True").lower() == "true"
+    MIRROR_MAX_AGE: float = float(os.getenv("MIRROR_MAX_AGE", "900"))
+    
+    # Background sync scheduler: every account's mirror is refreshed about every SYNC_INTERVAL seconds
+    # (+/- SYNC_JITTER as a fraction); first runs are SYNC_STAGGER seconds apart per account
+    SYNC_SCHEDULER_ENABLED: bool = os.getenv("SYNC_SCHEDULER_ENABLED", "True").lower() == "true"
+    SYNC_INTERVAL: float = float(os.getenv("SYNC_INTERVAL", "600"))
+    SYNC_JITTER: float = float(os.getenv("SYNC_JITTER", "0.1"))
+    SYNC_STAGGER: float = float(os.getenv("SYNC_STAGGER", "5"))
+    # Accounts synced at once per worker; a worker's claim on an account expires after SYNC_LEASE_SECONDS unless renewed
+    SYNC_CONCURRENCY: int = int(os.getenv("SYNC_CONCURRENCY", "2"))
+    SYNC_LEASE_SECONDS: float = float(os.getenv("SYNC_LEASE_SECONDS", "120"))
+    SYNC_TICK_SECONDS: float = float(os.getenv("SYNC_TICK_SECONDS", "5"))
+    # Record sets of unchanged domains are skipped by syncs, but refetched at least this often (seconds).
+    # Record edits made at Dynu directly do not change the domain entry and reach the mirror only then
+    SYNC_RECORDS_MAX_AGE: float = float(os.getenv("SYNC_RECORDS_MAX_AGE", "86400"))
+    
+    # Dashboard per-account stats: refreshed in the background once older than this (seconds)
+    DASHBOARD_STATS_TTL: float = float(os.getenv("DASHBOARD_STATS_TTL", "300"))
+    
+    # Cross-account domain search: accounts loaded at once, matches returned per account
+    GLOBAL_SEARCH_CONCURRENCY: int = int(os.getenv("GLOBAL_SEARCH_CONCURRENCY", "8"))
+    GLOBAL_SEARCH_LIMIT: int = int(os.getenv("GLOBAL_SEARCH_LIMIT", "200"))
+    
+    # Stream large HTML pages (domains, DNS records) in chunks instead of buffering them
+    TEMPLATE_STREAMING: bool = os.getenv("TEMPLATE_STREAMING", "True").lower() == "true"
+    TEMPLATE_STREAM_FIRST_CHUNK_SIZE: int = int(os.getenv("TEMPLATE_STREAM_FIRST_CHUNK_SIZE", "4096"))
+    TEMPLATE_STREAM_CHUNK_SIZE: int = int(os.getenv("TEMPLATE_STREAM_CHUNK_SIZE", "32768"))
+    
+    # Shared Jinja environment: compiled-template cache on disk, reload checks off in production
+    TEMPLATE_CACHE_DIR: str = os.getenv("TEMPLATE_CACHE_DIR", "./.template_cache")
+    TEMPLATE_AUTO_RELOAD: bool = os.getenv(
+        "TEMPLATE_AUTO_RELOAD", "False" if ENVIRONMENT.lower() == "production" else "True"
+    ).lower() == "true"
+    TEMPLATE_PRECOMPILE: bool = os.getenv("TEMPLATE_PRECOMPILE", "True").lower() == "true"
+    
+    # Response compression (brotli when installed, else gzip) and precompressed static files
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "True").lower() == "true"
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+    STATIC_PRECOMPRESS: bool = os.getenv("STATIC_PRECOMPRESS", "True").lower() == "true"
+    # Browser cache lifetime for fingerprinted/vendored static assets (sent as immutable)
+    STATIC_MAX_AGE: int = int(os.getenv("STATIC_MAX_AGE", "31536000"))
+    # Load Bootstrap/Font Awesome from the CDN when static/vendor is incomplete (otherwise startup fails)
+    STATIC_VENDOR_CDN_FALLBACK: bool = os.getenv("STATIC_VENDOR_CDN_FALLBACK", "False").lower() == "true"
+    
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FILE: Optional[str] = os.getenv("LOG_FILE", "dns_management.log")
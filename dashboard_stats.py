@@ -0,0 +1,167 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+from bulk_operations import account_semaphore
+from config import settings
+from models import DynuAPI
+from scheduler import scheduler
+import mirror
+
+# A failed refresh is not retried on every page view
+RETRY_AFTER_FAILURE = 30
+
+
+@dataclass
+class AccountStats:
+    domain_count: int = 0
+    record_count: int = 0
+    synced_at: Optional[float] = None  # Wall-clock time of the last completed refresh
+    attempted_at: Optional[float] = None
+    error: Optional[str] = None
+    refreshing: bool = False
+
+    def to_dict(self):
+        return {
+            "domain_count": self.domain_count,
+            "record_count": self.record_count,
+            "synced_at": self.synced_at_text,
+            "error": self.error,
+            "refreshing": self.refreshing,
+        }
+
+    @property
+    def synced_at_text(self) -> str:
+        if self.synced_at is None:
+            return "never"
+        return datetime.fromtimestamp(self.synced_at, tz=timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+
+    def age(self) -> float:
+        return time.time() - self.synced_at if self.synced_at is not None else float("inf")
+
+
+class DashboardStats:
+    """Per-account summary stats, served from memory and refreshed in the background.
+
+    get() never calls Dynu: it returns what the last refresh found and, when
+    that is older than the TTL, starts a mirror sync for the next view
+    (stale-while-revalidate). Stats are per worker, but a worker that has not
+    refreshed an account yet starts from the counts of its last mirror sync.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._stats: Dict[int, AccountStats] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._all_tasks: Set[asyncio.Task] = set()
+
+    def _entry(self, account_id: int) -> AccountStats:
+        stats = self._stats.get(account_id)
+        if stats is None:
+            stats = self._stats[account_id] = AccountStats()
+            state = mirror.sync_states([account_id]).get(account_id) if settings.MIRROR_ENABLED else None
+            if state and state["records_synced_at"] is not None:
+                stats.domain_count = state["domain_count"]
+                stats.record_count = state["record_count"]
+                stats.synced_at = state["records_synced_at"].replace(tzinfo=timezone.utc).timestamp()
+        return stats
+
+    def get(self, account_id: int, api_key: str) -> AccountStats:
+        stats = self._entry(account_id)
+        recently_tried = stats.attempted_at is not None and time.time() - stats.attempted_at < RETRY_AFTER_FAILURE
+        if stats.age() >= self.ttl and not recently_tried and account_id not in self._tasks:
+            self.refresh_in_background(account_id, api_key)
+        stats.refreshing = account_id in self._tasks
+        return stats
+
+    def invalidate(self, account_id: int):
+        """Forget an account's stats (after a sync elsewhere); the next view starts from the mirror again"""
+        if account_id not in self._tasks:
+            self._stats.pop(account_id, None)
+
+    def refresh_in_background(self, account_id: int, api_key: str):
+        task = asyncio.ensure_future(self.refresh(account_id, api_key))
+        self._tasks[account_id] = task
+        self._all_tasks.add(task)
+
+        def done(finished: asyncio.Task):
+            self._all_tasks.discard(finished)
+            if self._tasks.get(account_id) is finished:
+                del self._tasks[account_id]
+
+        task.add_done_callback(done)
+
+    async def refresh(self, account_id: int, api_key: str) -> AccountStats:
+        stats = self._entry(account_id)
+        stats.attempted_at = time.time()
+        try:
+            return await self._refresh(account_id, api_key, stats)
+        except Exception as e:
+            print(f"DEBUG: Dashboard stats refresh failed: {type(e).__name__}: {e}")
+            stats.error = "Refresh failed"
+            return stats
+
+    async def _refresh(self, account_id: int, api_key: str, stats: AccountStats) -> AccountStats:
+        """Take the counts from the account's mirror, syncing it from Dynu first when it is stale"""
+        if not settings.MIRROR_ENABLED:
+            return await self._count(api_key, stats)
+        state = (await mirror.run_db(mirror.sync_states, [account_id])).get(account_id)
+        synced_at = state["records_synced_at"] if state else None
+        recent = synced_at is not None and (datetime.utcnow() - synced_at).total_seconds() < self.ttl
+        if settings.SYNC_SCHEDULER_ENABLED or recent:
+            # The scheduler (or another sync) keeps the mirror current; syncing here as well would double the upstream calls
+            if synced_at is None:
+                stats.error = state["last_error"] if state else None
+                return stats
+            stats.domain_count = state["domain_count"]
+            stats.record_count = state["record_count"]
+            stats.synced_at = synced_at.replace(tzinfo=timezone.utc).timestamp()
+            stats.error = state["last_error"]
+            return stats
+        # Same lease as "Sync now" and scheduled runs, so only one sync of an account runs at a time
+        report = await scheduler.run_now(account_id, api_key)
+        if report is None:
+            return stats  # Another sync holds the lease; its counts are read on the next attempt
+        if report.error:
+            stats.error = report.error
+            return stats
+        stats.domain_count = report.domain_count
+        stats.record_count = report.record_count
+        stats.synced_at = time.time()
+        stats.error = None
+        print(f"DEBUG: Dashboard stats refreshed: {stats.domain_count} domains, {stats.record_count} records")
+        return stats
+
+    async def _count(self, api_key: str, stats: AccountStats) -> AccountStats:
+        """Count domains and records straight from Dynu (record sets come from the record cache when fresh)"""
+        dynu_api = DynuAPI(api_key)
+        entry = await dynu_api.domain_list()
+        if entry is None:
+            stats.error = "Could not load domains from Dynu"
+            return stats
+        semaphore = account_semaphore(api_key)
+
+        async def count_records(domain_id) -> int:
+            async with semaphore:
+                return len(await dynu_api.get_domain_records(domain_id))
+
+        domain_ids = [d.get("id") for d in list(entry.domains) if d.get("id") is not None]
+        counts = await asyncio.gather(*(count_records(domain_id) for domain_id in domain_ids))
+        stats.domain_count = len(domain_ids)
+        stats.record_count = sum(counts)
+        stats.synced_at = time.time()
+        stats.error = None
+        print(f"DEBUG: Dashboard stats refreshed: {stats.domain_count} domains, {stats.record_count} records")
+        return stats
+
+    async def close(self):
+        """Cancel refreshes still running at shutdown"""
+        for task in list(self._all_tasks):
+            task.cancel()
+        if self._all_tasks:
+            await asyncio.gather(*self._all_tasks, return_exceptions=True)
+
+
+dashboard_stats = DashboardStats(ttl=settings.DASHBOARD_STATS_TTL)
@@ -42,6 +42,10 @@ venv/bin/pip install --upgrade pip
 echo "📦 Installing Python dependencies..."
 venv/bin/pip install -r requirements.txt
 
+# Self-host Bootstrap and Font Awesome (downloads must match vendor.lock; the app does not start without them)
+echo "📦 Vendoring static assets..."
+venv/bin/python assets.py vendor
+
 # Create .env file from example
 if [ ! -f .env ]; then
     echo "⚙️ Creating environment configuration..."
@@ -0,0 +1,65 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from cache import domain_cache
+from config import settings
+from models import DynuAPI
+
+
+async def search_account(account_id: int, account_name: str, api_key: str, query: str, match: str,
+                         limit: int) -> Dict[str, Any]:
+    """Search one account's domain list (cached when fresh, else one upstream fetch)"""
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"account_id": account_id, "account_name": account_name}
+    cached = domain_cache.get(api_key) is not None
+    try:
+        entry = await DynuAPI(api_key, account_id).domain_list()
+    except Exception as e:
+        print(f"DEBUG: Global search failed for account {account_id}: {type(e).__name__}: {e}")
+        entry = None
+    if entry is None:
+        result["error"] = "Could not load domains from Dynu"
+    else:
+        positions = entry.query_positions(query, match)
+        result["total"] = len(positions)
+        result["matches"] = [
+            {"id": entry.domains[p].get("id"), "name": entry.domains[p].get("name")} for p in positions[:limit]
+        ]
+    result["cached"] = cached
+    result["elapsed"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+async def search_accounts(accounts: List[Tuple[int, str, str]], query: str, match: str = "contains",
+                          limit: Optional[int] = None,
+                          concurrency: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Search every (id, name, api_key) account concurrently, yielding results as they are ready.
+
+    At most `concurrency` accounts are loaded at once; accounts answered from
+    the cache finish immediately, so the total time is bounded by the slowest
+    upstream fetch rather than the sum of them.
+    """
+    limit = limit or settings.GLOBAL_SEARCH_LIMIT
+    semaphore = asyncio.Semaphore(max(1, concurrency or settings.GLOBAL_SEARCH_CONCURRENCY))
+    started = time.perf_counter()
+
+    async def run(account):
+        if domain_cache.get(account[2]) is not None:
+            # Answered from memory: no upstream call, so no need to queue for a slot
+            return await search_account(*account, query, match, limit)
+        async with semaphore:
+            return await search_account(*account, query, match, limit)
+
+    tasks = [asyncio.ensure_future(run(account)) for account in accounts]
+    found = 0
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            found += result.get("total", 0)
+            yield result
+    finally:
+        # Client went away mid-stream: stop the remaining account lookups
+        for task in tasks:
+            task.cancel()
+    yield {"done": True, "accounts": len(tasks), "total": found, "elapsed": round(time.perf_counter() - started, 3)}
@@ -1,28 +1,59 @@
 from fastapi import FastAPI, Depends, HTTPException, Request, Form, status, Cookie
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.middleware.sessions import SessionMiddleware
+from contextlib import asynccontextmanager
 
 # Import shared components
 from models import (
     get_db, User, Account, DynuAPI, UserCreate, AccountCreate, DomainOperation,
     verify_password, get_password_hash, create_access_token,
+    get_http_client, close_http_client,
     SECRET_KEY, ALGORITHM
 )
 from config import settings
+from templating import precompile_templates
+from compression import CompressionMiddleware, precompress_static
+from assets import AssetStaticFiles, manifest, missing_vendor_assets
+from dashboard_stats import dashboard_stats
+from scheduler import scheduler
 
 security = HTTPBearer()
 
-app = FastAPI(title="DNS Management System", description="Manage domains with Dynu.com")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the shared Dynu connection pool for this worker and close it on shutdown
+    get_http_client()
+    if settings.TEMPLATE_PRECOMPILE:
+        precompile_templates()
+    if settings.STATIC_PRECOMPRESS:
+        print(f"DEBUG: Precompressed {precompress_static('static')} static file(s)")
+    print(f"DEBUG: Fingerprinted {manifest.build()} static file(s)")
+    missing = missing_vendor_assets()
+    if missing and not settings.STATIC_VENDOR_CDN_FALLBACK:
+        raise RuntimeError(f"{len(missing)} vendored static file(s) missing (e.g. {missing[0]}): run "
+                           f"`python assets.py vendor`, or set STATIC_VENDOR_CDN_FALLBACK=true to use the CDN")
+    if missing:
+        print(f"WARNING: {len(missing)} vendored static file(s) missing; pages load them from the CDN")
+    if settings.SYNC_SCHEDULER_ENABLED:
+        scheduler.start()
+    yield
+    await scheduler.stop()
+    await dashboard_stats.close()
+    await close_http_client()
+
+app = FastAPI(title="DNS Management System", description="Manage domains with Dynu.com", lifespan=lifespan)
 
 # Add session middleware for flash messages
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
 
-# Mount static files and templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+# Compress HTML/JSON responses (static files are served precompressed)
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+# Mount static files: fingerprinted names cache as immutable, .br/.gz copies are served when accepted
+# (templates are shared via templating.py)
+app.mount("/static", AssetStaticFiles(directory="static"), name="static")
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db = Depends(get_db)):
     credentials_exception = HTTPException(
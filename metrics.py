@@ -0,0 +1,52 @@
+import re
+import threading
+from collections import defaultdict
+from typing import Dict
+
+# Simple in-process counters (per worker); exposed as JSON on /debug/metrics
+_counters: Dict[str, int] = defaultdict(int)
+_lock = threading.Lock()
+
+_ID_SEGMENT = re.compile(r"/\d+")
+
+
+def endpoint_name(method: str, path: str) -> str:
+    """Collapse numeric path segments so /dns/123/record counts as /dns/{id}/record"""
+    return f"{method} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+def incr(name: str, value: int = 1):
+    with _lock:
+        _counters[name] += value
+
+
+def record_upstream_call(method: str, path: str, attempts: int, status_code: int = 0):
+    """Count one logical upstream call and how many HTTP attempts it took"""
+    endpoint = endpoint_name(method, path)
+    with _lock:
+        _counters["upstream.calls"] += 1
+        _counters["upstream.attempts"] += attempts
+        _counters["upstream.retries"] += attempts - 1
+        _counters[f"upstream.attempts_per_call.{attempts}"] += 1
+        _counters[f"upstream.endpoint.{endpoint}.calls"] += 1
+        _counters[f"upstream.endpoint.{endpoint}.attempts"] += attempts
+        if status_code:
+            _counters[f"upstream.status.{status_code}"] += 1
+
+
+def hit_ratios(counters: Dict[str, int]) -> Dict[str, float]:
+    """Derive cache.<name>.hit_ratio from the cache.<name>.hits/misses counters"""
+    ratios = {}
+    for key, hits in counters.items():
+        if key.startswith("cache.") and key.endswith(".hits"):
+            name = key[:-len(".hits")]
+            total = hits + counters.get(f"{name}.misses", 0)
+            ratios[f"{name}.hit_ratio"] = round(hits / total, 4) if total else 0.0
+    return ratios
+
+
+def snapshot() -> Dict[str, float]:
+    with _lock:
+        counters = dict(_counters)
+    counters.update(hit_ratios(counters))
+    return dict(sorted(counters.items()))
@@ -0,0 +1,514 @@
+import asyncio
+import functools
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from bulk_operations import account_semaphore
+from cache import content_digest, domain_cache, record_cache
+from config import settings
+from models import SessionLocal, MirroredDomain, MirroredRecord, MirroredRecordSet, MirrorSyncState, DynuAPI
+import metrics
+
+# Keep IN (...) lists under SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+# Attempts of a mirror write that lost an insert race to another writer
+CONFLICT_RETRIES = 3
+
+
+def _chunks(items: List, size: int = CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _retry_on_conflict(function):
+    """Re-run a mirror write (and so its diff) when another sync inserted the same rows first"""
+
+    @functools.wraps(function)
+    def wrapper(*args):
+        for attempt in range(1, CONFLICT_RETRIES + 1):
+            try:
+                return function(*args)
+            except IntegrityError:
+                if attempt == CONFLICT_RETRIES:
+                    raise
+                metrics.incr("mirror.write_conflicts")
+                print(f"DEBUG: Mirror {function.__name__} lost a write race, retrying ({attempt}/{CONFLICT_RETRIES})")
+                time.sleep(random.uniform(0.01, 0.05) * attempt)
+
+    return wrapper
+
+
+def _is_fresh(synced_at: Optional[datetime], max_age: Optional[float]) -> bool:
+    max_age = settings.MIRROR_MAX_AGE if max_age is None else max_age
+    return synced_at is not None and datetime.utcnow() - synced_at < timedelta(seconds=max_age)
+
+
+def _domain_row(account_id: int, domain: dict, position: int, digest: str, now: datetime) -> dict:
+    return {
+        "account_id": account_id,
+        "domain_id": domain["id"],
+        "position": position,
+        "name": domain.get("name"),
+        "state": bool(domain.get("state", True)),
+        "ipv4_address": domain.get("ipv4Address") or None,
+        "updated_on": domain.get("updatedOn"),
+        "data": json.dumps(domain),
+        "digest": digest,
+        "synced_at": now,
+    }
+
+
+def _record_row(account_id: int, domain_id: int, record: dict, position: int, digest: str, now: datetime) -> dict:
+    return {
+        "account_id": account_id,
+        "domain_id": domain_id,
+        "record_id": record["id"],
+        "position": position,
+        "record_type": record.get("recordType"),
+        "node_name": record.get("nodeName"),
+        "data": json.dumps(record),
+        "digest": digest,
+        "synced_at": now,
+    }
+
+
+# Reads (None means "not mirrored recently enough, ask Dynu")
+
+def load_domains(account_id: int, max_age: Optional[float] = None) -> Optional[List[dict]]:
+    db = SessionLocal()
+    try:
+        state = db.get(MirrorSyncState, account_id)
+        if state is None or not _is_fresh(state.domains_synced_at, max_age):
+            return None
+        rows = (
+            db.query(MirroredDomain.data)
+            .filter(MirroredDomain.account_id == account_id)
+            .order_by(MirroredDomain.position, MirroredDomain.id)
+        )
+        return [json.loads(data) for (data,) in rows]
+    finally:
+        db.close()
+
+
+def load_domain(account_id: int, domain_id: int, max_age: Optional[float] = None) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        row = db.query(MirroredDomain).filter_by(account_id=account_id, domain_id=domain_id).first()
+        if row is None or not _is_fresh(row.synced_at, max_age):
+            return None
+        return json.loads(row.data)
+    finally:
+        db.close()
+
+
+def load_records(account_id: int, domain_id: int, max_age: Optional[float] = None) -> Optional[List[dict]]:
+    db = SessionLocal()
+    try:
+        domain = db.query(MirroredDomain.records_synced_at).filter_by(account_id=account_id, domain_id=domain_id).first()
+        if domain is None or not _is_fresh(domain.records_synced_at, max_age):
+            return None
+        rows = (
+            db.query(MirroredRecord.data)
+            .filter(MirroredRecord.account_id == account_id, MirroredRecord.domain_id == domain_id)
+            .order_by(MirroredRecord.position, MirroredRecord.id)
+        )
+        return [json.loads(data) for (data,) in rows]
+    finally:
+        db.close()
+
+
+def sync_states(account_ids: Iterable[int]) -> Dict[int, dict]:
+    """Last sync time and row counts per account, for the dashboard"""
+    account_ids = list(account_ids)
+    db = SessionLocal()
+    try:
+        states = {}
+        for chunk in _chunks(account_ids):
+            for state in db.query(MirrorSyncState).filter(MirrorSyncState.account_id.in_(chunk)):
+                states[state.account_id] = {
+                    "domain_count": state.domain_count or 0,
+                    "record_count": state.record_count or 0,
+                    "domains_synced_at": state.domains_synced_at,
+                    "records_synced_at": state.records_synced_at,
+                    "last_error": state.last_error,
+                }
+        return states
+    finally:
+        db.close()
+
+
+# Write-through for changes made by this app (do not count as a sync)
+
+@_retry_on_conflict
+def upsert_domain(account_id: int, domain: dict):
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        row = db.query(MirroredDomain).filter_by(account_id=account_id, domain_id=domain["id"]).first()
+        if row is None:
+            last = db.query(func.max(MirroredDomain.position)).filter_by(account_id=account_id).scalar()
+            db.add(MirroredDomain(**_domain_row(account_id, domain, (last or 0) + 1, content_digest(domain), now)))
+        else:
+            for key, value in _domain_row(account_id, domain, row.position, content_digest(domain), now).items():
+                setattr(row, key, value)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _delete_domain_rows(db, account_id: int, domain_ids: List[int]):
+    for chunk in _chunks(list(domain_ids)):
+        for model in (MirroredRecord, MirroredRecordSet, MirroredDomain):
+            db.query(model).filter(
+                model.account_id == account_id, model.domain_id.in_(chunk)
+            ).delete(synchronize_session=False)
+
+
+def _forget_record_digest(db, account_id: int, domain_id: int):
+    """Mirror rows no longer match the fetched set, so the next sync must diff them again"""
+    db.query(MirroredRecordSet).filter_by(account_id=account_id, domain_id=domain_id).update({"records_digest": None})
+
+
+def delete_domains(account_id: int, domain_ids: List[int]):
+    db = SessionLocal()
+    try:
+        _delete_domain_rows(db, account_id, domain_ids)
+        db.commit()
+    finally:
+        db.close()
+
+
+def mark_domains_stale(account_id: int):
+    db = SessionLocal()
+    try:
+        db.query(MirrorSyncState).filter_by(account_id=account_id).update({"domains_synced_at": None})
+        db.commit()
+    finally:
+        db.close()
+
+
+@_retry_on_conflict
+def upsert_record(account_id: int, domain_id: int, record: dict):
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        row = db.query(MirroredRecord).filter_by(account_id=account_id, domain_id=domain_id, record_id=record["id"]).first()
+        if row is None:
+            last = db.query(func.max(MirroredRecord.position)).filter_by(account_id=account_id, domain_id=domain_id).scalar()
+            db.add(MirroredRecord(**_record_row(account_id, domain_id, record, (last or 0) + 1, content_digest(record), now)))
+        else:
+            for key, value in _record_row(account_id, domain_id, record, row.position, content_digest(record), now).items():
+                setattr(row, key, value)
+        _forget_record_digest(db, account_id, domain_id)
+        db.commit()
+    finally:
+        db.close()
+
+
+def delete_record(account_id: int, domain_id: int, record_id: int):
+    db = SessionLocal()
+    try:
+        db.query(MirroredRecord).filter_by(account_id=account_id, domain_id=domain_id, record_id=record_id).delete()
+        _forget_record_digest(db, account_id, domain_id)
+        db.commit()
+    finally:
+        db.close()
+
+
+def mark_records_stale(account_id: int, domain_id: int):
+    db = SessionLocal()
+    try:
+        db.query(MirroredDomain).filter_by(account_id=account_id, domain_id=domain_id).update({"records_synced_at": None})
+        # Dropping the fingerprint makes the next sync fetch this record set
+        db.query(MirroredRecordSet).filter_by(account_id=account_id, domain_id=domain_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def delete_account(account_id: int):
+    db = SessionLocal()
+    try:
+        db.query(MirroredRecord).filter_by(account_id=account_id).delete()
+        db.query(MirroredRecordSet).filter_by(account_id=account_id).delete()
+        db.query(MirroredDomain).filter_by(account_id=account_id).delete()
+        db.query(MirrorSyncState).filter_by(account_id=account_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+# Sync engine: diff upstream state against the mirror by content digest and write only what changed
+
+def _sync_state(db, account_id: int) -> MirrorSyncState:
+    state = db.get(MirrorSyncState, account_id)
+    if state is None:
+        state = MirrorSyncState(account_id=account_id)
+        db.add(state)
+    return state
+
+
+@_retry_on_conflict
+def apply_domains(account_id: int, domains: List[dict]) -> Dict[str, int]:
+    """Upsert the account's full domain list; rows for domains no longer listed are removed"""
+    counts = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        existing = {
+            domain_id: (row_id, digest, position)
+            for row_id, domain_id, digest, position in db.query(
+                MirroredDomain.id, MirroredDomain.domain_id, MirroredDomain.digest, MirroredDomain.position
+            ).filter(MirroredDomain.account_id == account_id)
+        }
+        inserts, updates, seen = [], [], set()
+        for position, domain in enumerate(domains):
+            domain_id = domain.get("id") if isinstance(domain, dict) else None
+            if domain_id is None or domain_id in seen:
+                continue
+            seen.add(domain_id)
+            digest = content_digest(domain)
+            current = existing.get(domain_id)
+            if current is None:
+                inserts.append(_domain_row(account_id, domain, position, digest, now))
+                counts["added"] += 1
+            elif current[1] != digest:
+                updates.append(dict(_domain_row(account_id, domain, position, digest, now), id=current[0]))
+                counts["updated"] += 1
+            else:
+                if current[2] != position:
+                    updates.append({"id": current[0], "position": position})
+                counts["unchanged"] += 1
+        if inserts:
+            db.bulk_insert_mappings(MirroredDomain, inserts)
+        if updates:
+            db.bulk_update_mappings(MirroredDomain, updates)
+        gone = [domain_id for domain_id in existing if domain_id not in seen]
+        _delete_domain_rows(db, account_id, gone)
+        counts["deleted"] = len(gone)
+        state = _sync_state(db, account_id)
+        state.domains_synced_at = now
+        state.domain_count = len(seen)
+        state.last_error = None
+        db.commit()
+        return counts
+    finally:
+        db.close()
+
+
+def record_fingerprints(account_id: int) -> Dict[int, tuple]:
+    """domain id -> (fingerprint, fetched_at) of every record set fetched for the account"""
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            MirroredRecordSet.domain_id, MirroredRecordSet.fingerprint, MirroredRecordSet.fetched_at
+        ).filter(MirroredRecordSet.account_id == account_id)
+        return {domain_id: (fingerprint, fetched_at) for domain_id, fingerprint, fetched_at in rows}
+    finally:
+        db.close()
+
+
+@_retry_on_conflict
+def apply_records(account_id: int, record_sets: Dict[int, List[dict]], fingerprints: Dict[int, str]) -> Dict[str, int]:
+    """Upsert the fetched record sets of the given domains (domains left out are not touched).
+
+    `fingerprints` holds the domain digest each set was fetched under. A
+    fetched set whose digest matches the last fetch is not diffed. Only
+    fetched sets become fresh: a domain skipped by the sync keeps the
+    freshness of its last fetch.
+    """
+    counts = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        known: Dict[int, Optional[str]] = {}
+        for chunk in _chunks(list(record_sets)):
+            rows = db.query(MirroredRecordSet.domain_id, MirroredRecordSet.records_digest).filter(
+                MirroredRecordSet.account_id == account_id, MirroredRecordSet.domain_id.in_(chunk)
+            )
+            known.update(rows)
+        set_rows, domain_ids = [], []
+        for domain_id, records in record_sets.items():
+            records_digest = content_digest(records)
+            row = {
+                "account_id": account_id,
+                "domain_id": domain_id,
+                "fingerprint": fingerprints.get(domain_id),
+                "records_digest": records_digest,
+                "record_count": len(records),
+                "fetched_at": now,
+            }
+            set_rows.append(row)
+            if domain_id in known and known[domain_id] == records_digest:
+                counts["unchanged"] += len(records)
+            else:
+                domain_ids.append(domain_id)
+        existing: Dict[tuple, tuple] = {}
+        for chunk in _chunks(domain_ids):
+            rows = db.query(
+                MirroredRecord.id, MirroredRecord.domain_id, MirroredRecord.record_id,
+                MirroredRecord.digest, MirroredRecord.position,
+            ).filter(MirroredRecord.account_id == account_id, MirroredRecord.domain_id.in_(chunk))
+            for row_id, domain_id, record_id, digest, position in rows:
+                existing[(domain_id, record_id)] = (row_id, digest, position)
+        inserts, updates, seen = [], [], set()
+        for domain_id in domain_ids:
+            for position, record in enumerate(record_sets[domain_id]):
+                record_id = record.get("id") if isinstance(record, dict) else None
+                if record_id is None or (domain_id, record_id) in seen:
+                    continue
+                seen.add((domain_id, record_id))
+                digest = content_digest(record)
+                current = existing.get((domain_id, record_id))
+                if current is None:
+                    inserts.append(_record_row(account_id, domain_id, record, position, digest, now))
+                    counts["added"] += 1
+                elif current[1] != digest:
+                    updates.append(dict(_record_row(account_id, domain_id, record, position, digest, now), id=current[0]))
+                    counts["updated"] += 1
+                else:
+                    if current[2] != position:
+                        updates.append({"id": current[0], "position": position})
+                    counts["unchanged"] += 1
+        if inserts:
+            db.bulk_insert_mappings(MirroredRecord, inserts)
+        if updates:
+            db.bulk_update_mappings(MirroredRecord, updates)
+        gone = [current[0] for key, current in existing.items() if key not in seen]
+        for chunk in _chunks(gone):
+            db.query(MirroredRecord).filter(MirroredRecord.id.in_(chunk)).delete(synchronize_session=False)
+        counts["deleted"] = len(gone)
+        db.bulk_insert_mappings(MirroredRecordSet, [row for row in set_rows if row["domain_id"] not in known])
+        db.bulk_update_mappings(MirroredRecordSet, [row for row in set_rows if row["domain_id"] in known])
+        for chunk in _chunks(list(record_sets)):
+            db.query(MirroredDomain).filter(
+                MirroredDomain.account_id == account_id, MirroredDomain.domain_id.in_(chunk)
+            ).update({"records_synced_at": now}, synchronize_session=False)
+        state = _sync_state(db, account_id)
+        state.records_synced_at = now
+        state.record_count = db.query(func.count(MirroredRecord.id)).filter(MirroredRecord.account_id == account_id).scalar()
+        db.commit()
+        return counts
+    finally:
+        db.close()
+
+
+@_retry_on_conflict
+def record_sync_error(account_id: int, error: str):
+    db = SessionLocal()
+    try:
+        _sync_state(db, account_id).last_error = error[:500]
+        db.commit()
+    finally:
+        db.close()
+
+
+@dataclass
+class SyncReport:
+    account_id: int
+    domains: Dict[str, int] = field(default_factory=dict)
+    records: Dict[str, int] = field(default_factory=dict)
+    record_sets_fetched: int = 0
+    record_sets_failed: int = 0
+    record_sets_skipped: int = 0  # Unchanged fingerprint: one upstream call saved each
+    domain_count: int = 0
+    record_count: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def changed(self) -> int:
+        return sum(self.domains.get(k, 0) + self.records.get(k, 0) for k in ("added", "updated", "deleted"))
+
+    def summary(self) -> str:
+        if self.error:
+            return f"Sync failed: {self.error}"
+        return (
+            f"Synced {self.domain_count} domains and {self.record_count} records in {self.elapsed:.1f}s "
+            f"({self.changed} row(s) changed"
+            + (f", {self.record_sets_skipped} unchanged domain(s) skipped" if self.record_sets_skipped else "")
+            + (f", {self.record_sets_failed} record set(s) could not be fetched" if self.record_sets_failed else "")
+            + ")"
+        )
+
+
+async def run_db(function, *args):
+    """Mirror writes can touch many rows; keep them off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, function, *args)
+
+
+# One sync per account at a time in this worker; other workers are kept out by the sync_schedule lease
+_sync_locks: Dict[int, asyncio.Lock] = {}
+
+
+async def sync_account(account_id: int, api_key: str, include_records: bool = True, force: bool = False) -> SyncReport:
+    """Pull the account's domains (and record sets) from Dynu and upsert what changed into the mirror.
+
+    A domain's record set is only fetched when the domain entry (and so its
+    updatedOn) changed since the last fetch, or that fetch is older than
+    SYNC_RECORDS_MAX_AGE; force=True fetches every record set. The domain
+    entry does not cover record edits made at Dynu directly: those reach the
+    mirror on the next refetch. Skipped sets are not marked fresh, so reads
+    go to Dynu once their last fetch is older than MIRROR_MAX_AGE.
+    """
+    async with _sync_locks.setdefault(account_id, asyncio.Lock()):
+        return await _sync_account(account_id, api_key, include_records, force)
+
+
+async def _sync_account(account_id: int, api_key: str, include_records: bool, force: bool) -> SyncReport:
+    started = time.perf_counter()
+    report = SyncReport(account_id=account_id)
+    dynu_api = DynuAPI(api_key)  # No account id: always read upstream, never the mirror itself
+    domains = await dynu_api.fetch_domains()
+    if domains is None:
+        report.error = "Could not load domains from Dynu"
+        await run_db(record_sync_error, account_id, report.error)
+        report.elapsed = time.perf_counter() - started
+        return report
+    domain_cache.put(api_key, domains)
+    report.domains = await run_db(apply_domains, account_id, domains)
+
+    if include_records:
+        semaphore = account_semaphore(api_key)
+
+        async def fetch(domain_id: int):
+            async with semaphore:
+                return domain_id, await dynu_api.fetch_domain_records(domain_id)
+
+        known = {} if force else await run_db(record_fingerprints, account_id)
+        refetch_before = datetime.utcnow() - timedelta(seconds=settings.SYNC_RECORDS_MAX_AGE)
+        fingerprints, unchanged = {}, []
+        for domain in domains:
+            domain_id = domain.get("id") if isinstance(domain, dict) else None
+            if domain_id is None or domain_id in fingerprints:
+                continue
+            fingerprint = content_digest(domain)
+            previous = known.get(domain_id)
+            if previous and previous[0] == fingerprint and previous[1] and previous[1] >= refetch_before:
+                unchanged.append(domain_id)
+            else:
+                fingerprints[domain_id] = fingerprint
+        results = await asyncio.gather(*(fetch(domain_id) for domain_id in fingerprints))
+        record_sets = {domain_id: records for domain_id, records in results if records is not None}
+        for domain_id, records in record_sets.items():
+            record_cache.put(api_key, domain_id, records)
+        report.record_sets_fetched = len(record_sets)
+        report.record_sets_failed = len(results) - len(record_sets)
+        report.record_sets_skipped = len(unchanged)
+        metrics.incr("sync.record_fetches_saved", len(unchanged))
+        report.records = await run_db(apply_records, account_id, record_sets, fingerprints)
+
+    state = (await run_db(sync_states, [account_id])).get(account_id, {})
+    report.domain_count = state.get("domain_count", 0)
+    report.record_count = state.get("record_count", 0)
+    report.elapsed = time.perf_counter() - started
+    print(f"DEBUG: Mirror sync of account {account_id}: {report.summary()}")
+    return report
@@ -1,15 +1,22 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, Index, UniqueConstraint
 from sqlalchemy.orm import declarative_base, sessionmaker, Session, Mapped, mapped_column
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from pydantic import BaseModel
 from fastapi import HTTPException, status, Cookie, Depends
+from email.utils import parsedate_to_datetime
+import asyncio
+import random
+import time
 import httpx
 
 # Import configuration
 from config import settings
+from cache import domain_cache, record_cache, DomainListEntry, content_digest
+import metrics
+import rate_limiter
 
 # Database setup
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
@@ -57,6 +64,80 @@ class Account(Base):
     user_id = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+# Local mirror of Dynu data (filled by mirror.py), so reads need no upstream round trip
+class MirroredDomain(Base):
+    __tablename__ = "mirror_domains"
+    __table_args__ = (
+        UniqueConstraint("account_id", "domain_id", name="uq_mirror_domains_account_domain"),
+        Index("ix_mirror_domains_account_name", "account_id", "name"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, nullable=False)
+    domain_id = Column(Integer, nullable=False)
+    position = Column(Integer, default=0)  # Order in Dynu's list
+    name = Column(String)
+    state = Column(Boolean, default=True)
+    ipv4_address = Column(String, index=True)
+    updated_on = Column(String)
+    data = Column(Text)  # Full Dynu JSON
+    digest = Column(String(40))
+    synced_at = Column(DateTime, default=datetime.utcnow)
+    records_synced_at = Column(DateTime, nullable=True)  # None: record set must be fetched again
+
+class MirroredRecord(Base):
+    __tablename__ = "mirror_records"
+    __table_args__ = (
+        UniqueConstraint("account_id", "domain_id", "record_id", name="uq_mirror_records_account_domain_record"),
+        Index("ix_mirror_records_account_type", "account_id", "record_type"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, nullable=False)
+    domain_id = Column(Integer, nullable=False)
+    record_id = Column(Integer, nullable=False)
+    position = Column(Integer, default=0)
+    record_type = Column(String)
+    node_name = Column(String)
+    data = Column(Text)
+    digest = Column(String(40))
+    synced_at = Column(DateTime, default=datetime.utcnow)
+
+class MirroredRecordSet(Base):
+    __tablename__ = "mirror_record_sets"
+    
+    account_id = Column(Integer, primary_key=True)
+    domain_id = Column(Integer, primary_key=True)
+    # Digest of the domain entry (which carries updatedOn) when its records were last fetched;
+    # while it still matches, the sync does not fetch the records again
+    fingerprint = Column(String(40))
+    records_digest = Column(String(40), nullable=True)  # None: mirror rows were changed since the fetch
+    record_count = Column(Integer, default=0)
+    fetched_at = Column(DateTime, nullable=True)
+
+class MirrorSyncState(Base):
+    __tablename__ = "mirror_sync_state"
+    
+    account_id = Column(Integer, primary_key=True)
+    domains_synced_at = Column(DateTime, nullable=True)  # None: domain list must be fetched again
+    records_synced_at = Column(DateTime, nullable=True)
+    domain_count = Column(Integer, default=0)
+    record_count = Column(Integer, default=0)
+    last_error = Column(String, nullable=True)
+
+# Background sync schedule (scheduler.py); the lease makes one worker at a time own an account's refresh
+class SyncSchedule(Base):
+    __tablename__ = "sync_schedule"
+    
+    account_id = Column(Integer, primary_key=True)
+    next_run_at = Column(DateTime, nullable=False)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_started_at = Column(DateTime, nullable=True)
+    last_finished_at = Column(DateTime, nullable=True)
+    last_status = Column(String, nullable=True)  # "ok" | "error" | "skipped"
+    last_message = Column(String, nullable=True)
+
 # Pydantic models
 class UserCreate(BaseModel):
     username: str
@@ -80,6 +161,17 @@ class BulkDNSRecordCreate(BaseModel):
     domain_ids: List[int]  # List of domain IDs to add records to
     records: List[DNSRecordCreate]  # List of DNS records to add
 
+class DesiredRecordSet(BaseModel):
+    domain_ids: List[int] = []  # Domains (by id and/or name) that should all carry exactly these records
+    domain_names: List[str] = []
+    records: List[DNSRecordCreate]
+    record_types: Optional[List[str]] = None  # Types this spec manages (default: the types in `records`)
+    prune: bool = True  # Delete records of the managed types that are not in the spec
+
+class RecordPlanRequest(BaseModel):
+    sets: List[DesiredRecordSet]
+    plan_id: Optional[str] = None  # On apply: refuse if the current plan differs from the one reviewed
+
 # Create tables
 Base.metadata.create_all(bind=engine)
 
@@ -134,162 +226,486 @@ def get_current_user_from_cookie_impl(access_token: Optional[str], db: Session):
 def get_current_user_from_cookie(access_token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
     return get_current_user_from_cookie_impl(access_token, db)
 
+# Shared upstream HTTP client: one keep-alive connection pool per worker process
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the worker-wide pooled client, creating it on first use"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.DYNU_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.DYNU_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.DYNU_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(settings.DYNU_TIMEOUT, connect=settings.DYNU_CONNECT_TIMEOUT),
+        )
+    return _http_client
+
+async def close_http_client():
+    """Close the pooled client (called on app shutdown)"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# Upstream retry policy
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Capped exponential backoff with full jitter, deferring to Retry-After when given"""
+    server_delay = parse_retry_after(retry_after)
+    if server_delay is not None:
+        return min(server_delay, settings.RETRY_MAX_DELAY)
+    backoff = min(settings.RETRY_MAX_DELAY, settings.RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+    return random.uniform(0, backoff)
+
+# In-flight upstream GETs of this worker, keyed by (API key, path), for request coalescing
+_inflight: dict = {}
+
+# Mirror write-throughs (mirror.py functions) of an account's domain list and of one domain's records
+MIRROR_DOMAIN_WRITES = {"upsert_domain", "delete_domains"}
+MIRROR_RECORD_WRITES = {"upsert_record", "delete_record"}
+
 # Dynu API integration
 class DynuAPI:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, account_id: Optional[int] = None):
         self.api_key = api_key
-        self.base_url = "https://api.dynu.com/v2"
+        # With an account id, cache misses are served from the local mirror while it is recent
+        self.account_id = account_id
+        self.base_url = settings.DYNU_API_BASE_URL
+        # Per-key headers are sent with each request; the connection pool itself is shared
         self.headers = {
             "API-Key": api_key,
             "Content-Type": "application/json"
         }
     
-    async def get_domains(self, page: int = 1, per_page: int = 10, search: str = None):
-        async with httpx.AsyncClient() as client:
-            # First, get all domains (Dynu API might not support pagination)
-            response = await client.get(f"{self.base_url}/dns", headers=self.headers)
-            if response.status_code == 200:
-                data = response.json()
-                # Handle different response formats
-                if isinstance(data, dict) and "domains" in data:
-                    all_domains = data["domains"]
-                elif isinstance(data, list):
-                    all_domains = data
-                else:
-                    all_domains = []
-                
-                
-                # Client-side search filtering
-                if search and all_domains:
-                    filtered_domains = []
-                    search_lower = search.lower()
-                    for domain in all_domains:
-                        domain_name = domain.get("name", "") if isinstance(domain, dict) else str(domain)
-                        if search_lower in domain_name.lower():
-                            filtered_domains.append(domain)
-                    all_domains = filtered_domains
-                
-                # Calculate pagination
-                total = len(all_domains)
-                total_pages = (total + per_page - 1) // per_page if total > 0 else 1
-                
-                # Client-side pagination
-                start = (page - 1) * per_page
-                end = start + per_page
-                paginated_domains = all_domains[start:end]
-                
-                return {
-                    "domains": paginated_domains,
-                    "pagination": {
-                        "page": page,
-                        "per_page": per_page,
-                        "total": total,
-                        "pages": total_pages
-                    }
-                }
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return get_http_client()
+    
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send an upstream call, coalescing concurrent identical GETs into one.
+        
+        While a GET for the same API key and path is in flight in this worker, later
+        callers await that call instead of issuing their own; every waiter gets the
+        same response, or the same exception.
+        """
+        if method.upper() != "GET" or kwargs:
+            return await self._send(method, path, **kwargs)
+        key = (self.api_key, path)
+        task = _inflight.get(key)
+        if task is not None:
+            metrics.incr("upstream.coalesced")
+        else:
+            task = asyncio.ensure_future(self._send(method, path))
+            _inflight[key] = task
+            task.add_done_callback(lambda _: _inflight.pop(key, None))
+        # shield: one waiter giving up must not cancel the call for the others
+        return await asyncio.shield(task)
+    
+    async def _send(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send one upstream call over the shared pool with rate limiting and retries.
+        
+        Idempotent methods are retried on 429, 5xx and network errors. POST is only
+        retried when Dynu certainly did not apply it: a 429 or a failed connect.
+        """
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        max_attempts = max(1, settings.RETRY_MAX_ATTEMPTS)
+        attempt = 0
+        while True:
+            attempt += 1
+            await rate_limiter.acquire(self.api_key)
+            try:
+                response = await self.client.request(method, f"{self.base_url}{path}", headers=self.headers, **kwargs)
+            except httpx.RequestError as e:
+                retryable = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if not retryable or attempt >= max_attempts:
+                    metrics.record_upstream_call(method, path, attempt)
+                    metrics.incr("upstream.network_errors")
+                    raise
+                await asyncio.sleep(retry_delay(attempt))
+                continue
             
-            return {"domains": [], "pagination": {"page": 1, "per_page": per_page, "total": 0, "pages": 0}}
+            retryable = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUSES)
+            if not retryable or attempt >= max_attempts:
+                metrics.record_upstream_call(method, path, attempt, response.status_code)
+                return response
+            print(f"DEBUG: {method} {path} returned {response.status_code}, retrying (attempt {attempt}/{max_attempts})")
+            await asyncio.sleep(retry_delay(attempt, response.headers.get("Retry-After")))
     
+    def domain_name(self, domain_id: int) -> str:
+        """Name of a domain seen by this worker, without an upstream call"""
+        entry = domain_cache.peek(self.api_key)
+        domain = entry.by_id.get(domain_id) if entry else None
+        return (domain or {}).get("name") or f"ID:{domain_id}"
+    
+    @staticmethod
+    def _error_message(response: httpx.Response) -> str:
+        """Best-effort human readable error from a non-200 Dynu response"""
+        error_msg = f"Status {response.status_code}: {response.text}"
+        try:
+            error_data = response.json()
+            if isinstance(error_data, dict) and "message" in error_data:
+                error_msg = error_data["message"]
+        except Exception:
+            pass
+        return error_msg
+
+    async def _mirror(self, operation: str, *args):
+        """Run a mirror.py function for this account in a worker thread (None when unavailable)"""
+        if self.account_id is None or not settings.MIRROR_ENABLED:
+            return None
+        import mirror  # mirror.py imports this module
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, getattr(mirror, operation), self.account_id, *args)
+        except Exception as e:
+            print(f"WARNING: Mirror {operation} failed for account {self.account_id}: {type(e).__name__}: {e}")
+        # A lost write-through leaves the mirror behind Dynu: mark what it touched stale so reads go upstream
+        if operation in MIRROR_DOMAIN_WRITES:
+            stale, stale_args = "mark_domains_stale", ()
+        elif operation in MIRROR_RECORD_WRITES:
+            stale, stale_args = "mark_records_stale", args[:1]
+        else:
+            return None
+        try:
+            await loop.run_in_executor(None, getattr(mirror, stale), self.account_id, *stale_args)
+        except Exception as e:
+            print(f"WARNING: Mirror {stale} failed for account {self.account_id}: {type(e).__name__}: {e}")
+        return None
+
+    async def fetch_domains(self) -> Optional[List[dict]]:
+        """Fetch the full domain list from Dynu (bypassing caches), or None if the call failed"""
+        # Dynu API does not support pagination, so this is always the whole list
+        response = await self._request("GET", "/dns")
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        # Handle different response formats
+        if isinstance(data, dict) and "domains" in data:
+            domains = data["domains"]
+        elif isinstance(data, list):
+            domains = data
+        else:
+            domains = []
+        return domains
+
+    async def domain_list(self) -> Optional[DomainListEntry]:
+        """Cached domain list of the account, refreshed from Dynu once the TTL expires.
+        
+        On a miss the local mirror is tried before Dynu. If the refresh fails, the
+        last known (stale) list is served rather than nothing.
+        """
+        entry = domain_cache.get(self.api_key)
+        if entry is not None:
+            metrics.incr("cache.domains.hits")
+            return entry
+        metrics.incr("cache.domains.misses")
+        domains = await self._mirror("load_domains")
+        if domains is not None:
+            metrics.incr("mirror.domains.hits")
+            return domain_cache.put(self.api_key, domains)
+        domains = await self.fetch_domains()
+        if domains is None:
+            return domain_cache.peek(self.api_key)
+        return domain_cache.put(self.api_key, domains)
+
+    async def get_domain(self, domain_id: int) -> Optional[dict]:
+        """Look up one domain by id: cached id index first, else a single-domain fetch"""
+        entry = domain_cache.get(self.api_key)
+        if entry is not None and domain_id in entry.by_id:
+            metrics.incr("cache.domains.hits")
+            return entry.by_id[domain_id]
+        metrics.incr("cache.domains.misses")
+        domain = await self._mirror("load_domain", domain_id)
+        if domain is not None:
+            metrics.incr("mirror.domains.hits")
+            return domain
+        response = await self._request("GET", f"/dns/{domain_id}")
+        if response.status_code == 200:
+            domain = response.json()
+            if isinstance(domain, dict) and domain.get("id") is not None:
+                return domain
+            return None
+        if response.status_code != 404:
+            # Upstream trouble: an expired cache entry is better than a false "not found"
+            stale = domain_cache.peek(self.api_key)
+            if stale is not None:
+                return stale.by_id.get(domain_id)
+        return None
+    
+    def cached_domains_digest(self) -> Optional[str]:
+        """Digest of the fresh cached domain list, or None if rendering it would need an upstream call"""
+        entry = domain_cache.get(self.api_key)
+        return entry.digest if entry is not None else None
+    
+    def cached_records_digest(self, domain_id: int) -> Optional[str]:
+        """Digest of a domain and its fresh cached records, or None if either needs an upstream call"""
+        records = record_cache.get(self.api_key, domain_id)
+        domains = domain_cache.peek(self.api_key)
+        domain = domains.by_id.get(domain_id) if domains is not None else None
+        if records is None or domain is None:
+            return None
+        return content_digest([domain, records.digest])
+    
+    async def list_domains(self) -> List[dict]:
+        """Get every domain of the account (empty list on upstream failure)"""
+        entry = await self.domain_list()
+        return entry.domains if entry else []
+
+    async def query_domains(self, search: str = None, match: str = "contains", filters: dict = None, sort: str = None) -> List[dict]:
+        """Cached domains matching search and attribute filters, in the requested sort order"""
+        entry = await self.domain_list()
+        if entry is None:
+            return []
+        if not (search or sort or any((filters or {}).values())):
+            return entry.domains
+        # Indexed search ("contains", "prefix" or "exact"), attribute indexes and precomputed sort ranks
+        return entry.query(search, match, filters, sort)
+
+    async def get_domains(self, page: int = 1, per_page: int = 10, search: str = None, match: str = "contains",
+                          filters: dict = None, sort: str = None):
+        entry = await self.domain_list()
+        if entry is not None:
+            all_domains = await self.query_domains(search, match, filters, sort)
+
+            # Calculate pagination
+            total = len(all_domains)
+            total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+
+            # Client-side pagination
+            start = (page - 1) * per_page
+            end = start + per_page
+            paginated_domains = all_domains[start:end]
+
+            return {
+                "domains": paginated_domains,
+                "pagination": {
+                    "page": page,
+                    "per_page": per_page,
+                    "total": total,
+                    "pages": total_pages
+                }
+            }
+
+        return {"domains": [], "pagination": {"page": 1, "per_page": per_page, "total": 0, "pages": 0}}
+
+    async def count_domains(self, search: str = None, match: str = "contains", filters: dict = None) -> int:
+        """Number of domains (matching the search and filters, if any) without building a page"""
+        entry = await self.domain_list()
+        if entry is None:
+            return 0
+        if not (search or any((filters or {}).values())):
+            return len(entry.domains)
+        return len(entry.query_positions(search, match, filters))
+    
+    async def create_domain(self, domain_name: str) -> Tuple[str, Optional[str]]:
+        """Add a domain and report ("created" | "exists" | "failed", error message)"""
+        try:
+            response = await self._request("POST", "/dns", json={"name": domain_name})
+        except httpx.RequestError as e:
+            return "failed", f"Network error: {str(e)}"
+        if response.status_code == 200:
+            try:
+                created = response.json()
+            except ValueError:
+                created = None
+            if isinstance(created, dict) and "id" in created:
+                domain_cache.add(self.api_key, created)
+                await self._mirror("upsert_domain", created)
+            else:
+                domain_cache.invalidate(self.api_key)
+                await self._mirror("mark_domains_stale")
+            return "created", None
+        error_msg = self._error_message(response)
+        if "exist" in error_msg.lower():
+            return "exists", error_msg
+        return "failed", error_msg
+
     async def add_domain(self, domain_name: str):
-        async with httpx.AsyncClient() as client:
-            data = {"name": domain_name}
-            response = await client.post(f"{self.base_url}/dns", headers=self.headers, json=data)
-            return response.status_code == 200
+        status, _ = await self.create_domain(domain_name)
+        return status == "created"
+
+    async def remove_domain(self, domain_id: int, update_cache: bool = True) -> Tuple[str, Optional[str]]:
+        """Delete a domain and report ("deleted" | "failed", error message).
+        
+        Bulk callers pass update_cache=False and call forget_domains once at the end.
+        """
+        try:
+            response = await self._request("DELETE", f"/dns/{domain_id}")
+        except httpx.RequestError as e:
+            return "failed", f"Network error: {str(e)}"
+        if response.status_code == 200:
+            if update_cache:
+                await self.forget_domains([domain_id])
+            return "deleted", None
+        return "failed", self._error_message(response)
+    
+    async def forget_domains(self, domain_ids: List[int]):
+        """Drop deleted domains (and their cached and mirrored records) in a single pass"""
+        domain_cache.remove(self.api_key, domain_ids)
+        for domain_id in domain_ids:
+            record_cache.invalidate(self.api_key, domain_id)
+        await self._mirror("delete_domains", domain_ids)
     
     async def delete_domain(self, domain_id: int):
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(f"{self.base_url}/dns/{domain_id}", headers=self.headers)
-            return response.status_code == 200
+        status, _ = await self.remove_domain(domain_id)
+        return status == "deleted"
     
-    async def get_domain_records(self, domain_id: int):
-        """Get all DNS records for a specific domain"""
-        async with httpx.AsyncClient() as client:
-            try:
-                print(f"DEBUG: Fetching DNS records for domain ID: {domain_id}")
-                response = await client.get(f"{self.base_url}/dns/{domain_id}/record", headers=self.headers)
-                print(f"DEBUG: Response status code: {response.status_code}")
-                print(f"DEBUG: Response headers: {dict(response.headers)}")
-                
-                if response.status_code == 200:
-                    try:
-                        data = response.json()
-                        print(f"DEBUG: Response data type: {type(data)}")
-                        print(f"DEBUG: Response data: {data}")
-                        
-                        if isinstance(data, dict):
-                            records = data.get("dnsRecords", [])
-                            print(f"DEBUG: Found {len(records)} records in 'dnsRecords' key")
-                            return records
-                        elif isinstance(data, list):
-                            print(f"DEBUG: Response is a list with {len(data)} records")
-                            return data
-                        else:
-                            print(f"DEBUG: Unexpected data format: {data}")
-                            return []
-                    except Exception as json_error:
-                        print(f"DEBUG: JSON parsing error: {json_error}")
-                        print(f"DEBUG: Raw response text: {response.text}")
+    async def fetch_domain_records(self, domain_id: int) -> Optional[List[dict]]:
+        """Fetch DNS records of a domain from Dynu (bypassing caches), or None if the call failed"""
+        try:
+            print(f"DEBUG: Fetching DNS records for domain ID: {domain_id}")
+            response = await self._request("GET", f"/dns/{domain_id}/record")
+            
+            if response.status_code == 200:
+                try:
+                    data = response.json()
+                    if isinstance(data, dict):
+                        records = data.get("dnsRecords", [])
+                        print(f"DEBUG: Found {len(records)} records in 'dnsRecords' key")
+                        return records
+                    elif isinstance(data, list):
+                        print(f"DEBUG: Response is a list with {len(data)} records")
+                        return data
+                    else:
+                        print(f"DEBUG: Unexpected data format: {data}")
                         return []
-                else:
-                    print(f"DEBUG: Non-200 status code: {response.status_code}")
-                    print(f"DEBUG: Response text: {response.text}")
-                    return []
-                    
-            except Exception as e:
-                print(f"DEBUG: Exception in get_domain_records: {type(e).__name__}: {e}")
-                import traceback
-                print(f"DEBUG: Traceback: {traceback.format_exc()}")
-                return []
+                except Exception as json_error:
+                    print(f"DEBUG: JSON parsing error: {json_error}")
+                    print(f"DEBUG: Raw response text: {response.text}")
+                    return None
+            else:
+                print(f"DEBUG: Non-200 status code: {response.status_code}")
+                print(f"DEBUG: Response text: {response.text}")
+                return None
+                
+        except Exception as e:
+            print(f"DEBUG: Exception in get_domain_records: {type(e).__name__}: {e}")
+            import traceback
+            print(f"DEBUG: Traceback: {traceback.format_exc()}")
+            return None
+    
+    async def get_domain_records(self, domain_id: int):
+        """Get all DNS records for a specific domain (empty list on upstream failure)"""
+        records = await self.load_domain_records(domain_id)
+        return records if records is not None else []
     
+    async def load_domain_records(self, domain_id: int) -> Optional[List[dict]]:
+        """Records from the record cache, then the mirror, then Dynu; None if none of them has the domain"""
+        entry = record_cache.get(self.api_key, domain_id)
+        if entry is not None:
+            metrics.incr("cache.records.hits")
+            return entry.records
+        metrics.incr("cache.records.misses")
+        records = await self._mirror("load_records", domain_id)
+        if records is not None:
+            metrics.incr("mirror.records.hits")
+            return record_cache.put(self.api_key, domain_id, records).records
+        records = await self.fetch_domain_records(domain_id)
+        if records is None:
+            stale = record_cache.peek(self.api_key, domain_id)
+            return stale.records if stale else None
+        return record_cache.put(self.api_key, domain_id, records).records
+    
+    def record_data(self, record_type: str, name: str, value: str, priority: int = 10, ttl: int = 120, state: bool = True) -> dict:
+        """Dynu request body for a record"""
+        # Normalize node name based on record type and Dynu API requirements
+        normalized_name = self._normalize_node_name(name, record_type.upper())
+
+        record_data = {
+            "recordType": record_type.upper(),
+            "nodeName": normalized_name,
+            "ttl": ttl,
+            "state": state
+        }
+
+        # Handle different record types
+        if record_type.upper() == "A":
+            record_data["ipv4Address"] = value
+        elif record_type.upper() == "TXT":
+            record_data["textData"] = value
+        elif record_type.upper() == "MX":
+            record_data["host"] = value
+            record_data["priority"] = priority
+        elif record_type.upper() == "SPF":
+            record_data["textData"] = value
+            record_data["recordType"] = "SPF"  # SPF records are stored as TXT records
+        return record_data
+
     async def add_dns_record(self, domain_id: int, record_type: str, name: str, value: str, priority: int = 10, ttl: int = 120, state: bool = True):
         """Add a DNS record to a domain"""
-        async with httpx.AsyncClient() as client:
-            try:
-                # Normalize node name based on record type and Dynu API requirements
-                normalized_name = self._normalize_node_name(name, record_type.upper())
-
-                record_data = {
-                    "recordType": record_type.upper(),
-                    "nodeName": normalized_name,
-                    "ttl": ttl,
-                    "state": state
-                }
+        record_data = self.record_data(record_type, name, value, priority, ttl, state)
+        print(f"DEBUG: Adding {record_type} record with data: {record_data}")
+        return await self.create_dns_record(domain_id, record_data)
 
-                # Handle different record types
-                if record_type.upper() == "A":
-                    record_data["ipv4Address"] = value
-                elif record_type.upper() == "TXT":
-                    record_data["textData"] = value
-                elif record_type.upper() == "MX":
-                    record_data["host"] = value
-                    record_data["priority"] = priority
-                elif record_type.upper() == "SPF":
-                    record_data["textData"] = value
-                    record_data["recordType"] = "SPF"  # SPF records are stored as TXT records
-
-                print(f"DEBUG: Adding {record_type} record with data: {record_data}")
-                response = await client.post(f"{self.base_url}/dns/{domain_id}/record", headers=self.headers, json=record_data)
-
-                if response.status_code == 200:
-                    return True, None
+    async def create_dns_record(self, domain_id: int, record_data: dict) -> Tuple[bool, Optional[str]]:
+        """POST a prepared record body (see record_data) and patch the caches"""
+        try:
+            response = await self._request("POST", f"/dns/{domain_id}/record", json=record_data)
+
+            if response.status_code == 200:
+                # Patch the cached record set in place when Dynu echoes the new record
+                try:
+                    created = response.json()
+                except ValueError:
+                    created = None
+                if isinstance(created, dict) and "id" in created:
+                    record_cache.add(self.api_key, domain_id, created)
+                    await self._mirror("upsert_record", domain_id, created)
                 else:
-                    error_msg = f"Status {response.status_code}: {response.text}"
-                    print(f"DEBUG: Failed to add record. {error_msg}")
-                    try:
-                        error_data = response.json()
-                        if isinstance(error_data, dict) and "message" in error_data:
-                            error_msg = error_data["message"]
-                    except:
-                        pass
-                    return False, error_msg
-            except httpx.RequestError as e:
-                error_msg = f"Network error: {str(e)}"
-                print(f"DEBUG: Request error in add_dns_record: {error_msg}")
-                return False, error_msg
-            except Exception as e:
-                error_msg = f"Unexpected error: {str(e)}"
-                print(f"DEBUG: Unexpected error in add_dns_record: {error_msg}")
-                return False, error_msg
+                    record_cache.invalidate(self.api_key, domain_id)
+                    await self._mirror("mark_records_stale", domain_id)
+                return True, None
+            else:
+                print(f"DEBUG: Failed to add record. Status {response.status_code}: {response.text}")
+                return False, self._error_message(response)
+        except httpx.RequestError as e:
+            error_msg = f"Network error: {str(e)}"
+            print(f"DEBUG: Request error in add_dns_record: {error_msg}")
+            return False, error_msg
+        except Exception as e:
+            error_msg = f"Unexpected error: {str(e)}"
+            print(f"DEBUG: Unexpected error in add_dns_record: {error_msg}")
+            return False, error_msg
+    
+    async def update_dns_record(self, domain_id: int, record_id: int, record_data: dict) -> Tuple[bool, Optional[str]]:
+        """Replace an existing record with a prepared record body"""
+        try:
+            response = await self._request("POST", f"/dns/{domain_id}/record/{record_id}", json=record_data)
+        except httpx.RequestError as e:
+            return False, f"Network error: {str(e)}"
+        if response.status_code != 200:
+            print(f"DEBUG: Failed to update record {record_id}. Status {response.status_code}: {response.text}")
+            return False, self._error_message(response)
+        try:
+            updated = response.json()
+        except ValueError:
+            updated = None
+        if isinstance(updated, dict) and updated.get("id") == record_id:
+            record_cache.replace(self.api_key, domain_id, updated)
+            await self._mirror("upsert_record", domain_id, updated)
+        else:
+            record_cache.invalidate(self.api_key, domain_id)
+            await self._mirror("mark_records_stale", domain_id)
+        return True, None
     
     def _normalize_node_name(self, name: str, record_type: str) -> str:
         """Normalize node name based on Dynu API requirements for different record types"""
@@ -326,6 +742,9 @@ class DynuAPI:
     
     async def delete_dns_record(self, domain_id: int, record_id: int):
         """Delete a DNS record"""
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(f"{self.base_url}/dns/{domain_id}/record/{record_id}", headers=self.headers)
-            return response.status_code == 200
\ No newline at end of file
+        response = await self._request("DELETE", f"/dns/{domain_id}/record/{record_id}")
+        if response.status_code == 200:
+            record_cache.remove(self.api_key, domain_id, record_id)
+            await self._mirror("delete_record", domain_id, record_id)
+            return True
+        return False
\ No newline at end of file
@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Dict, Tuple
+
+from config import settings
+
+try:
+    import sqlite3
+except ImportError:  # Python built without libsqlite3: fall back to a per-worker bucket
+    sqlite3 = None
+
+
+class TokenBucketLimiter:
+    """Token bucket per Dynu API key, shared by every gunicorn worker on the host.
+
+    Bucket state lives in a small SQLite file so all worker processes draw from
+    the same budget without any outside service. Callers reserve a token up
+    front (the balance may go negative) and sleep until their slot comes up, so
+    bursts queue in arrival order instead of failing.
+    """
+
+    def __init__(self, path: str, rate: float, burst: int):
+        self.path = path
+        self.rate = max(rate, 0.001)
+        self.burst = max(burst, 1)
+        self._local = threading.local()
+        self._memory: Dict[str, Tuple[float, float]] = {}
+        self._memory_lock = threading.Lock()
+
+    @staticmethod
+    def bucket_key(api_key: str) -> str:
+        # Never store raw API keys on disk
+        return hashlib.sha256(api_key.encode()).hexdigest()[:32]
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _refill(self, tokens: float, updated: float, now: float) -> float:
+        return min(float(self.burst), tokens + (now - updated) * self.rate)
+
+    def _reserve_sqlite(self, key: str) -> float:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = self._refill(row[0], row[1], now) if row else float(self.burst)
+            tokens -= 1
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return max(0.0, -tokens / self.rate)
+
+    def _reserve_memory(self, key: str) -> float:
+        with self._memory_lock:
+            now = time.time()
+            tokens, updated = self._memory.get(key, (float(self.burst), now))
+            tokens = self._refill(tokens, updated, now) - 1
+            self._memory[key] = (tokens, now)
+        return max(0.0, -tokens / self.rate)
+
+    def reserve(self, api_key: str) -> float:
+        """Take one token and return how many seconds the caller must wait for it"""
+        key = self.bucket_key(api_key)
+        if sqlite3 is not None:
+            try:
+                return self._reserve_sqlite(key)
+            except sqlite3.Error as e:
+                print(f"WARNING: rate limiter database unavailable ({e}), using per-worker limit")
+        return self._reserve_memory(key)
+
+    async def acquire(self, api_key: str):
+        """Wait until this API key may make one more upstream call"""
+        loop = asyncio.get_running_loop()
+        wait = await loop.run_in_executor(None, self.reserve, api_key)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+rate_limiter = TokenBucketLimiter(
+    settings.RATE_LIMIT_DB,
+    rate=settings.RATE_LIMIT_PER_SECOND,
+    burst=settings.RATE_LIMIT_BURST,
+)
+
+
+async def acquire(api_key: str):
+    if settings.RATE_LIMIT_ENABLED:
+        await rate_limiter.acquire(api_key)
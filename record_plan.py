@@ -0,0 +1,221 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from bulk_operations import BulkResult, CREATED, DELETED, FAILED, UPDATED, account_semaphore, run_bulk
+from cache import content_digest
+from models import DynuAPI, RecordPlanRequest
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+
+# Body field holding each record type's value
+VALUE_FIELDS = {"A": "ipv4Address", "TXT": "textData", "SPF": "textData", "MX": "host"}
+# Values compared case-insensitively (host names and addresses, not TXT data)
+CASELESS_FIELDS = {"nodeName", "ipv4Address", "host"}
+
+
+def _normalized(record: dict, key: str) -> Any:
+    value = record.get(key)
+    if key == "nodeName":
+        value = (value or "").rstrip(".")
+    if isinstance(value, str):
+        value = value.strip()
+        if key in CASELESS_FIELDS:
+            value = value.lower()
+    return value
+
+
+def identity(record: dict) -> Tuple[str, str, Any]:
+    """(type, node name, value): records with the same identity are the same record"""
+    record_type = (record.get("recordType") or "").upper()
+    return record_type, _normalized(record, "nodeName"), _normalized(record, VALUE_FIELDS.get(record_type, ""))
+
+
+def differs(current: dict, desired: dict) -> bool:
+    """True if any field of the desired body is not what Dynu has"""
+    return any(_normalized(current, key) != _normalized(desired, key) for key in desired)
+
+
+@dataclass
+class RecordChange:
+    action: str
+    domain_id: int
+    domain: str
+    record_id: Optional[int] = None
+    data: Optional[dict] = None  # Request body for creates and updates
+    current: Optional[dict] = None  # Record being updated or deleted
+
+    @property
+    def label(self) -> str:
+        body = self.data or self.current or {}
+        name = body.get("nodeName") or "@"
+        return f"{self.action} {body.get('recordType')} {name} on {self.domain}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "action": self.action,
+            "domain_id": self.domain_id,
+            "domain": self.domain,
+            "record_id": self.record_id,
+            "data": self.data,
+            "current": self.current,
+        }
+
+
+@dataclass
+class RecordPlan:
+    changes: List[RecordChange] = field(default_factory=list)
+    unchanged: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def plan_id(self) -> str:
+        """Stable id of the changes, so an apply can insist on the plan that was reviewed"""
+        return content_digest([[c.action, c.domain_id, c.record_id, c.data] for c in self.changes])
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        counts = {CREATE: 0, UPDATE: 0, DELETE: 0, "unchanged": self.unchanged}
+        for change in self.changes:
+            counts[change.action] += 1
+        return counts
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "plan_id": self.plan_id,
+            "counts": self.counts,
+            "errors": self.errors,
+            "changes": [change.to_dict() for change in self.changes],
+        }
+
+
+def diff_records(domain_id: int, domain: str, current: List[dict], desired: List[dict],
+                 managed_types: set, prune: bool = True) -> Tuple[List[RecordChange], int]:
+    """Minimal changes turning `current` into `desired` for the managed record types.
+
+    Records are matched by identity first; when pruning, a leftover desired
+    record and a leftover current record with the same type and name become
+    one update (e.g. a changed address) instead of a delete plus a create.
+    Without pruning, records not in the spec are never touched, so leftovers
+    are always created.
+    """
+    changes: List[RecordChange] = []
+    unchanged = 0
+    pool: Dict[tuple, List[dict]] = {}
+    for record in current:
+        if (record.get("recordType") or "").upper() in managed_types:
+            pool.setdefault(identity(record), []).append(record)
+
+    leftovers: List[dict] = []
+    seen = set()
+    for data in desired:
+        if identity(data) in seen:
+            continue  # Listed twice: one record is enough
+        seen.add(identity(data))
+        matches = pool.get(identity(data))
+        if not matches:
+            leftovers.append(data)
+            continue
+        record = matches.pop(0)
+        if differs(record, data):
+            changes.append(RecordChange(UPDATE, domain_id, domain, record.get("id"), data, record))
+        else:
+            unchanged += 1
+
+    spare: Dict[tuple, List[dict]] = {}
+    for records in pool.values():
+        for record in records:
+            spare.setdefault(identity(record)[:2], []).append(record)
+    for data in leftovers:
+        candidates = spare.get(identity(data)[:2]) if prune else None
+        if candidates:
+            record = candidates.pop(0)
+            changes.append(RecordChange(UPDATE, domain_id, domain, record.get("id"), data, record))
+        else:
+            changes.append(RecordChange(CREATE, domain_id, domain, data=data))
+
+    if prune:
+        for records in spare.values():
+            for record in records:
+                changes.append(RecordChange(DELETE, domain_id, domain, record.get("id"), current=record))
+    return changes, unchanged
+
+
+async def build_plan(dynu_api: DynuAPI, spec: RecordPlanRequest) -> RecordPlan:
+    """Resolve the spec's domains and diff each against its current (cached when fresh) records"""
+    plan = RecordPlan()
+    entry = await dynu_api.domain_list()
+    domains = list(entry.domains) if entry else []
+    by_name = {(d.get("name") or "").lower(): d for d in domains}
+    by_id = {d.get("id"): d for d in domains}
+
+    # A domain named by several sets gets the records of all of them
+    wanted: Dict[int, Dict[str, Any]] = {}
+    for record_set in spec.sets:
+        bodies = [
+            dynu_api.record_data(r.record_type, r.name, r.value,
+                                 10 if r.priority is None else r.priority, 120 if r.ttl is None else r.ttl)
+            for r in record_set.records
+        ]
+        types = {t.upper() for t in (record_set.record_types or [b["recordType"] for b in bodies])}
+        targets = []
+        for domain_id in record_set.domain_ids:
+            if domain_id in by_id:
+                targets.append(domain_id)
+            else:
+                plan.errors.append(f"Domain {domain_id} not found")
+        for name in record_set.domain_names:
+            domain = by_name.get(name.strip().lower())
+            if domain is not None:
+                targets.append(domain.get("id"))
+            else:
+                plan.errors.append(f"Domain {name} not found")
+        for domain_id in dict.fromkeys(targets):
+            target = wanted.setdefault(domain_id, {"records": [], "types": set(), "prune": True})
+            target["records"].extend(bodies)
+            target["types"].update(types)
+            target["prune"] = target["prune"] and record_set.prune
+
+    semaphore = account_semaphore(dynu_api.api_key)
+
+    async def load(domain_id: int) -> Optional[List[dict]]:
+        async with semaphore:
+            return await dynu_api.load_domain_records(domain_id)
+
+    records = await asyncio.gather(*(load(domain_id) for domain_id in wanted))
+    for (domain_id, target), current in zip(wanted.items(), records):
+        if current is None:
+            # Planning against an unknown record set would re-create records that already exist
+            plan.errors.append(f"Could not load the records of {by_id[domain_id].get('name', domain_id)}")
+            continue
+        changes, unchanged = diff_records(
+            domain_id, by_id[domain_id].get("name", str(domain_id)), current,
+            target["records"], target["types"], target["prune"],
+        )
+        plan.changes.extend(changes)
+        plan.unchanged += unchanged
+    return plan
+
+
+async def apply_plan(dynu_api: DynuAPI, plan: RecordPlan) -> BulkResult:
+    """Run every change concurrently under the account-wide cap (and so the rate limiter)"""
+
+    async def apply_one(change: RecordChange) -> Tuple[str, Optional[str]]:
+        if change.action == CREATE:
+            success, error = await dynu_api.create_dns_record(change.domain_id, change.data)
+            return (CREATED, None) if success else (FAILED, error)
+        if change.action == UPDATE:
+            success, error = await dynu_api.update_dns_record(change.domain_id, change.record_id, change.data)
+            return (UPDATED, None) if success else (FAILED, error)
+        success = await dynu_api.delete_dns_record(change.domain_id, change.record_id)
+        return (DELETED, None) if success else (FAILED, "Delete failed")
+
+    return await run_bulk(
+        "apply record plan",
+        plan.changes,
+        apply_one,
+        label=lambda change: change.label,
+        semaphore=account_semaphore(dynu_api.api_key),
+    )
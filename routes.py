@@ -1,18 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form, status, Cookie
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, File, UploadFile, status, Cookie
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 from models import (
     get_db, User, Account, DynuAPI, UserCreate, AccountCreate, DomainOperation, DNSRecordCreate, BulkDNSRecordCreate,
+    RecordPlanRequest,
     verify_password, get_password_hash, create_access_token, get_current_user_from_cookie
 )
+from config import settings
 from subdomain_generator import SubdomainGenerator
-from datetime import timedelta
+from search_index import MATCH_MODES, STATE_FILTERS, parse_sort
+from templating import templates, stream_template, content_version
+from global_search import search_accounts
+from dashboard_stats import dashboard_stats
+import mirror
+from scheduler import schedule_states, scheduler
+from record_plan import build_plan, apply_plan
+from zone_import import import_zones, zone_sources
+from bulk_operations import (
+    BulkResult, bulk_add_domains, bulk_delete_domains, bulk_add_records,
+    CREATED, EXISTS, DELETED, FAILED
+)
+import metrics
+import asyncio
+from datetime import timedelta, datetime
+from urllib.parse import urlencode
 from typing import List, Optional
 import json
+import base64
+import hashlib
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 # Flash message utilities
 def set_flash(request: Request, message: str, category: str = "info"):
@@ -26,6 +43,99 @@ def get_flashed_messages(request: Request):
     messages = request.session.pop("flash_messages", [])
     return messages
 
+def wants_json(request: Request) -> bool:
+    """True when the caller asked for a JSON result instead of a redirect"""
+    return "application/json" in request.headers.get("accept", "")
+
+def report_bulk_result(request: Request, result: BulkResult, noun: str = "domain(s)"):
+    """Flash per-status counts and keep a compact per-item report for the next page view"""
+    verb = "delete" if result.action == "delete" else "add"
+    created = result.count(CREATED)
+    deleted = result.count(DELETED)
+    existing = result.count(EXISTS)
+    failed = result.count(FAILED)
+    if created > 0:
+        set_flash(request, f"Successfully added {created} {noun}", "success")
+    if deleted > 0:
+        set_flash(request, f"Successfully deleted {deleted} {noun}", "success")
+    if existing > 0:
+        set_flash(request, f"{existing} {noun} already existed", "info")
+    if failed > 0:
+        set_flash(request, f"Failed to {verb} {failed} {noun}", "error")
+    request.session["bulk_report"] = result.to_session()
+
+def has_pending_flash(request: Request) -> bool:
+    return bool(request.session.get("flash_messages") or request.session.get("bulk_report"))
+
+def page_etag(request: Request, current_user: User, data_digest: str, *parts) -> str:
+    """Weak ETag for a rendered page: template/static version, viewer, data, query and flash state"""
+    raw = json.dumps([
+        content_version(),
+        current_user.id,
+        current_user.username,
+        data_digest,
+        sorted(request.query_params.multi_items()),
+        request.session.get("flash_messages"),
+        request.session.get("bulk_report"),
+        *parts,
+    ], default=str)
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [weak_etag_value(tag.strip()) for tag in header.split(",")]
+    return "*" in tags or weak_etag_value(etag) in tags
+
+def weak_etag_value(tag: str) -> str:
+    # Weak comparison ignores the W/ prefix (str.removeprefix needs Python 3.9)
+    return tag[2:] if tag.startswith("W/") else tag
+
+def etag_headers(etag: Optional[str]) -> dict:
+    # "no-cache" still lets the browser store the page, it just has to revalidate it
+    headers = {"Cache-Control": "private, no-cache"}
+    if etag:
+        headers["ETag"] = etag
+    return headers
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+
+def domain_filters(
+    state: Optional[str] = None,
+    ipv4: Optional[str] = None,
+    ipv6: Optional[str] = None,
+    updated_after: Optional[str] = None,
+    updated_before: Optional[str] = None,
+) -> dict:
+    """Attribute filters for the cached domain list; empty or invalid values are dropped"""
+    filters = {
+        "state": state if state in STATE_FILTERS else None,
+        "ipv4": (ipv4 or "").strip() or None,
+        "ipv6": (ipv6 or "").strip() or None,
+        "updated_after": (updated_after or "").strip() or None,
+        "updated_before": (updated_before or "").strip() or None,
+    }
+    for key in ("updated_after", "updated_before"):
+        try:
+            if filters[key]:
+                datetime.fromisoformat(filters[key])
+        except ValueError:
+            filters[key] = None
+    return {key: value for key, value in filters.items() if value}
+
+def domain_list_query(search: Optional[str], match: str, filters: dict, sort: Optional[str]) -> str:
+    """Query string that carries the current search, filters and sort across page links"""
+    params = {}
+    if search:
+        params["search"] = search
+        params["match"] = match
+    params.update(filters)
+    if sort:
+        params["sort"] = sort
+    return urlencode(params)
+
 # Authentication routes
 @router.get("/", response_class=HTMLResponse)
 async def login_page(request: Request):
@@ -88,13 +198,71 @@ async def create_user_admin(
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request, current_user: User = Depends(get_current_user_from_cookie), db: Session = Depends(get_db)):
     accounts = db.query(Account).filter(Account.user_id == current_user.id).all()
+    # Stats come from memory; stale ones are refreshed in the background, never on this request
+    stats = {account.id: dashboard_stats.get(account.id, account.api_key) for account in accounts}
+    schedule = schedule_states(stats) if settings.MIRROR_ENABLED else {}
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
         "current_user": current_user,
         "accounts": accounts,
+        "stats": stats,
+        "schedule": schedule,
+        "total_domains": sum(s.domain_count for s in stats.values()),
+        "total_records": sum(s.record_count for s in stats.values()),
+        # A running sync (e.g. "Sync now") also keeps the page polling for the new counts
+        "refreshing": any(s.refreshing for s in stats.values()) or any(run["running"] for run in schedule.values()),
+        "messages": get_flashed_messages(request)
+    })
+
+@router.get("/api/dashboard/stats")
+async def dashboard_stats_api(current_user: User = Depends(get_current_user_from_cookie), db: Session = Depends(get_db)):
+    """Current per-account stats (polled by the dashboard while a refresh is running)"""
+    accounts = db.query(Account).filter(Account.user_id == current_user.id).all()
+    schedule = schedule_states(account.id for account in accounts) if settings.MIRROR_ENABLED else {}
+    rows = {}
+    for account in accounts:
+        row = rows[account.id] = dashboard_stats.get(account.id, account.api_key).to_dict()
+        row["refreshing"] = row["refreshing"] or schedule.get(account.id, {}).get("running", False)
+    return {"accounts": rows}
+
+# Cross-account domain search
+@router.get("/search", response_class=HTMLResponse)
+async def global_search_page(
+    request: Request,
+    q: Optional[str] = None,
+    match: str = "contains",
+    current_user: User = Depends(get_current_user_from_cookie)
+):
+    return templates.TemplateResponse("search.html", {
+        "request": request,
+        "current_user": current_user,
+        "q": q or "",
+        "match": match if match in MATCH_MODES else "contains",
         "messages": get_flashed_messages(request)
     })
 
+@router.get("/api/search")
+async def global_search_api(
+    q: str,
+    match: str = "contains",
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: Session = Depends(get_db)
+):
+    """Search every account of the user; one NDJSON line per account as it finishes, then a summary"""
+    if match not in MATCH_MODES:
+        match = "contains"
+    # Plain tuples: the DB session is closed while the response streams
+    accounts = [
+        (account.id, account.name, account.api_key)
+        for account in db.query(Account).filter(Account.user_id == current_user.id).all()
+    ]
+
+    async def lines():
+        async for result in search_accounts(accounts, q, match):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"Cache-Control": "no-store"})
+
 # Account management routes
 @router.get("/accounts", response_class=HTMLResponse)
 async def accounts_page(request: Request, current_user: User = Depends(get_current_user_from_cookie), db: Session = Depends(get_db)):
@@ -125,8 +293,28 @@ async def delete_account(account_id: int, current_user: User = Depends(get_curre
     if account:
         db.delete(account)
         db.commit()
+        mirror.delete_account(account_id)
     return RedirectResponse(url="/accounts", status_code=status.HTTP_302_FOUND)
 
+@router.post("/accounts/{account_id}/sync")
+async def sync_account(request: Request, account_id: int, current_user: User = Depends(get_current_user_from_cookie), db: Session = Depends(get_db)):
+    """Refresh the local mirror of one account from Dynu"""
+    account = db.query(Account).filter(Account.id == account_id, Account.user_id == current_user.id).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    if not settings.MIRROR_ENABLED:
+        set_flash(request, "The local mirror is disabled; pages always read from Dynu", "info")
+        return RedirectResponse(url=f"/domains/{account_id}", status_code=status.HTTP_302_FOUND)
+    # Runs in the background under the account's lease; the dashboard shows it running and then its result
+    task = await scheduler.start_now(account.id, account.api_key)
+    if task is None:
+        set_flash(request, "A sync of this account is already running", "info")
+    else:
+        # Drop this worker's stats so the dashboard reads the new counts from the mirror
+        task.add_done_callback(lambda _: dashboard_stats.invalidate(account_id))
+        set_flash(request, f"Sync of {account.name} started", "success")
+    return RedirectResponse(url="/dashboard", status_code=status.HTTP_302_FOUND)
+
 # Domain management routes
 @router.get("/domains/{account_id}", response_class=HTMLResponse)
 async def domains_page(
@@ -135,6 +323,13 @@ async def domains_page(
     page: int = 1,
     per_page: str = "10",
     search: Optional[str] = None,
+    match: str = "contains",
+    state: Optional[str] = None,
+    ipv4: Optional[str] = None,
+    ipv6: Optional[str] = None,
+    updated_after: Optional[str] = None,
+    updated_before: Optional[str] = None,
+    sort: Optional[str] = None,
     current_user: User = Depends(get_current_user_from_cookie),
     db: Session = Depends(get_db)
 ):
@@ -142,12 +337,17 @@ async def domains_page(
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
     
+    if match not in MATCH_MODES:
+        match = "contains"
+    filters = domain_filters(state, ipv4, ipv6, updated_after, updated_before)
+    sort = ",".join(f"{'-' if desc else ''}{field}" for field, desc in parse_sort(sort)) or None
+    
     # Ensure page is at least 1
     page = max(1, page)
     
     # Handle "all" option for per_page
     if per_page == "all":
-        per_page_int = 999999  # Large number to get all domains
+        per_page_int = None  # Rows are loaded client-side, page by page
         show_all = True
     else:
         try:
@@ -159,14 +359,29 @@ async def domains_page(
             per_page = "10"
             show_all = False
     
-    dynu_api = DynuAPI(account.api_key)
-    domains_data = await dynu_api.get_domains(page=page, per_page=per_page_int, search=search)
+    dynu_api = DynuAPI(account.api_key, account.id)
+    
+    # Conditional GET: answer from the cached list's digest without rendering or calling Dynu
+    account_parts = (account.id, account.name, str(account.created_at))
+    pending_flash = has_pending_flash(request)
+    digest = dynu_api.cached_domains_digest()
+    if digest and not pending_flash:
+        etag = page_etag(request, current_user, digest, *account_parts)
+        if etag_matches(request, etag):
+            metrics.incr("http.not_modified")
+            return not_modified(etag)
+    
+    if show_all:
+        # "Show all" renders an empty virtual-scrolling table; rows stream in from /api/domains
+        total = await dynu_api.count_domains(search=search, match=match, filters=filters)
+        domains_data = {"domains": [], "pagination": {"page": 1, "per_page": total, "total": total, "pages": 1}}
+    else:
+        domains_data = await dynu_api.get_domains(
+            page=page, per_page=per_page_int, search=search, match=match, filters=filters, sort=sort
+        )
     print(f"DEBUG: per_page param received = {per_page}")
     print(f"DEBUG: per_page_int after parsing = {per_page_int}")
-    # Debug: Print domain data to see the structure
-    print(f"DEBUG: Domains data structure: {domains_data}")
-    for i, domain in enumerate(domains_data.get("domains", [])[:3]):  # Print first 3 domains
-        print(f"DEBUG: Domain {i}: {domain}")
+    print(f"DEBUG: Rendering {len(domains_data.get('domains', []))} of {domains_data.get('pagination', {}).get('total')} domains")
     
     # Initialize subdomain generator
     subdomain_gen = SubdomainGenerator()
@@ -177,20 +392,114 @@ async def domains_page(
     print(f"DEBUG: suggestions count: {len(suggestions)}")
     print(f"DEBUG: per_page param received = {per_page}")
     print(f"DEBUG: per_page_int after parsing = {per_page_int}")
-    return templates.TemplateResponse("domains.html", {
+    digest = dynu_api.cached_domains_digest()
+    etag = page_etag(request, current_user, digest, *account_parts) if digest and not pending_flash else None
+    return stream_template("domains.html", {
         "request": request,
         "user": current_user,
         "account": account,
         "domains": domains_data.get("domains", []),
         "pagination": domains_data.get("pagination", {}),
         "search": search or "",
+        "match": match,
+        "filters": filters,
+        "sort": sort or "",
+        "list_query": domain_list_query(search, match, filters, sort),
         "per_page": per_page,
         "show_all": show_all,
         "main_domains": main_domains,
         "suggestions": suggestions,
-        "bulk_record_errors": request.session.pop("bulk_record_errors", []),
+        "bulk_report": request.session.pop("bulk_report", None),
         "messages": get_flashed_messages(request)
-    })
+    }, headers=etag_headers(etag))
+
+# Compact JSON domain rows with cursor pagination (feeds the virtual-scrolling table)
+DOMAIN_ROW_COLUMNS = ["id", "name", "created", "state"]
+MAX_DOMAIN_ROWS = 5000
+
+def encode_cursor(offset: int, last_id) -> str:
+    raw = json.dumps({"o": offset, "l": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        offset = int(data["o"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0:
+        # A negative offset would slice from the end of the list
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset, data.get("l")
+
+@router.get("/api/domains/{account_id}")
+async def domains_api(
+    account_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 500,
+    search: Optional[str] = None,
+    match: str = "contains",
+    state: Optional[str] = None,
+    ipv4: Optional[str] = None,
+    ipv6: Optional[str] = None,
+    updated_after: Optional[str] = None,
+    updated_before: Optional[str] = None,
+    sort: Optional[str] = None,
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: Session = Depends(get_db)
+):
+    account = db.query(Account).filter(Account.id == account_id, Account.user_id == current_user.id).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    if match not in MATCH_MODES:
+        match = "contains"
+    limit = min(max(1, limit), MAX_DOMAIN_ROWS)
+    filters = domain_filters(state, ipv4, ipv6, updated_after, updated_before)
+    
+    dynu_api = DynuAPI(account.api_key, account.id)
+    domains = await dynu_api.query_domains(search, match, filters, sort)
+    
+    offset = 0
+    if cursor:
+        offset, last_id = decode_cursor(cursor)
+        # If the list changed since the previous page, resume right after the last row sent
+        if last_id is not None and not (0 < offset <= len(domains) and domains[offset - 1].get("id") == last_id):
+            offset = next((i + 1 for i, d in enumerate(domains) if d.get("id") == last_id), min(offset, len(domains)))
+    
+    page = domains[offset:offset + limit]
+    end = offset + len(page)
+    return {
+        "columns": DOMAIN_ROW_COLUMNS,
+        "rows": [[d.get("id"), d.get("name"), d.get("created"), d.get("state", True)] for d in page],
+        "total": len(domains),
+        "next_cursor": encode_cursor(end, page[-1].get("id")) if page and end < len(domains) else None,
+    }
+
+@router.get("/api/domains/{account_id}/ids")
+async def domain_ids_api(
+    account_id: int,
+    search: Optional[str] = None,
+    match: str = "contains",
+    state: Optional[str] = None,
+    ipv4: Optional[str] = None,
+    ipv6: Optional[str] = None,
+    updated_after: Optional[str] = None,
+    updated_before: Optional[str] = None,
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: Session = Depends(get_db)
+):
+    """Every matching domain id, so "select all" covers rows not yet loaded or rendered"""
+    account = db.query(Account).filter(Account.id == account_id, Account.user_id == current_user.id).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    if match not in MATCH_MODES:
+        match = "contains"
+    filters = domain_filters(state, ipv4, ipv6, updated_after, updated_before)
+    
+    dynu_api = DynuAPI(account.api_key, account.id)
+    domains = await dynu_api.query_domains(search, match, filters)
+    return {"ids": [d.get("id") for d in domains]}
 
 @router.post("/domains/{account_id}/add")
 async def add_domains(
@@ -204,18 +513,12 @@ async def add_domains(
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    dynu_api = DynuAPI(account.api_key)
-    domain_list = [domain.strip() for domain in domains.split('\n') if domain.strip()]
+    dynu_api = DynuAPI(account.api_key, account.id)
+    result = await bulk_add_domains(dynu_api, domains.split('\n'))
 
-    success_count = 0
-    for domain in domain_list:
-        if await dynu_api.add_domain(domain):
-            success_count += 1
-
-    if success_count > 0:
-        set_flash(request, f"Successfully added {success_count} domain(s)", "success")
-    if success_count < len(domain_list):
-        set_flash(request, f"Failed to add {len(domain_list) - success_count} domain(s)", "error")
+    if wants_json(request):
+        return JSONResponse(result.to_dict())
+    report_bulk_result(request, result)
 
     return RedirectResponse(url=f"/domains/{account_id}", status_code=status.HTTP_302_FOUND)
 
@@ -231,17 +534,12 @@ async def delete_domains(
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    dynu_api = DynuAPI(account.api_key)
-
-    success_count = 0
-    for domain_id in domain_ids:
-        if await dynu_api.delete_domain(domain_id):
-            success_count += 1
+    dynu_api = DynuAPI(account.api_key, account.id)
+    result = await bulk_delete_domains(dynu_api, domain_ids)
 
-    if success_count > 0:
-        set_flash(request, f"Successfully deleted {success_count} domain(s)", "success")
-    if success_count < len(domain_ids):
-        set_flash(request, f"Failed to delete {len(domain_ids) - success_count} domain(s)", "error")
+    if wants_json(request):
+        return JSONResponse(result.to_dict())
+    report_bulk_result(request, result)
 
     return RedirectResponse(url=f"/domains/{account_id}", status_code=status.HTTP_302_FOUND)
 
@@ -269,17 +567,12 @@ async def generate_subdomains(
             use_suffix=use_suffix
         )
 
-        dynu_api = DynuAPI(account.api_key)
-        success_count = 0
-
-        for subdomain in generated_subdomains:
-            if await dynu_api.add_domain(subdomain):
-                success_count += 1
+        dynu_api = DynuAPI(account.api_key, account.id)
+        result = await bulk_add_domains(dynu_api, generated_subdomains)
 
-        if success_count > 0:
-            set_flash(request, f"Successfully added {success_count} out of {len(generated_subdomains)} subdomains", "success")
-        if success_count < len(generated_subdomains):
-            set_flash(request, f"Failed to add {len(generated_subdomains) - success_count} subdomains", "error")
+        if wants_json(request):
+            return JSONResponse(result.to_dict())
+        report_bulk_result(request, result, noun="subdomain(s)")
 
     except ValueError as e:
         set_flash(request, f"Error: {str(e)}", "error")
@@ -303,13 +596,18 @@ async def add_custom_subdomain(
         subdomain_gen = SubdomainGenerator()
         full_subdomain = subdomain_gen.create_custom_subdomain(subdomain_name, main_domain)
 
-        dynu_api = DynuAPI(account.api_key)
-        success = await dynu_api.add_domain(full_subdomain)
+        dynu_api = DynuAPI(account.api_key, account.id)
+        result = await bulk_add_domains(dynu_api, [full_subdomain])
+        outcome = result.items[0]
 
-        if success:
+        if wants_json(request):
+            return JSONResponse(result.to_dict())
+        if outcome.status == CREATED:
             set_flash(request, f"Successfully added subdomain: {full_subdomain}", "success")
+        elif outcome.status == EXISTS:
+            set_flash(request, f"Subdomain already exists: {full_subdomain}", "info")
         else:
-            set_flash(request, f"Failed to add subdomain: {full_subdomain}", "error")
+            set_flash(request, f"Failed to add subdomain: {full_subdomain} ({outcome.error})", "error")
 
     except ValueError as e:
         set_flash(request, f"Error: {str(e)}", "error")
@@ -328,14 +626,19 @@ async def find_domain_by_name(
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
     
-    dynu_api = DynuAPI(account.api_key)
-    domains_data = await dynu_api.get_domains()
+    dynu_api = DynuAPI(account.api_key, account.id)
+    all_domains = await dynu_api.list_domains()
     
-    for domain in domains_data.get("domains", []):
+    for domain in all_domains:
         if domain.get("name") == domain_name:
             return {"found": True, "domain": domain}
     
-    return {"found": False, "searched_for": domain_name, "available_domains": [d.get("name") for d in domains_data.get("domains", [])]}
+    return {"found": False, "searched_for": domain_name, "available_domains": [d.get("name") for d in all_domains]}
+
+# Debug route exposing this worker's upstream counters (calls, attempts, retries)
+@router.get("/debug/metrics")
+async def debug_metrics(current_user: User = Depends(get_current_user_from_cookie)):
+    return metrics.snapshot()
 
 # DNS Record management routes
 @router.get("/domains/{account_id}/{domain_id}/records", response_class=HTMLResponse)
@@ -355,34 +658,33 @@ async def domain_records_page(
             raise HTTPException(status_code=404, detail="Account not found")
         
         print(f"DEBUG: Found account: {account.name}")
-        dynu_api = DynuAPI(account.api_key)
+        dynu_api = DynuAPI(account.api_key, account.id)
         
-        # Get domain details - fetch ALL domains without pagination limits
-        print(f"DEBUG: Fetching all domains list to find domain_id={domain_id}")
-        domains_data = await dynu_api.get_domains(page=1, per_page=1000)  # Set high per_page to get all domains
-        ids = [d["id"] for d in domains_data["domains"]]
-        print(f"DEBUG: Got domains ids: {ids}")
+        # Conditional GET: answer from the cached records' digest without rendering or calling Dynu
+        account_parts = (account.id, account.name)
+        pending_flash = has_pending_flash(request)
+        digest = dynu_api.cached_records_digest(domain_id)
+        if digest and not pending_flash:
+            etag = page_etag(request, current_user, digest, *account_parts)
+            if etag_matches(request, etag):
+                metrics.incr("http.not_modified")
+                return not_modified(etag)
         
-        domain = None
-        for d in domains_data.get("domains", []):
-            print(f"DEBUG: Checking domain: {d}")
-            if d.get("id") == domain_id:
-                domain = d
-                break
+        # Domain lookup (id index, no full list scan) and record fetch run concurrently
+        domain, records = await asyncio.gather(
+            dynu_api.get_domain(domain_id),
+            dynu_api.get_domain_records(domain_id)
+        )
         
         if not domain:
             print(f"DEBUG: Domain not found with ID {domain_id}")
-            print(f"DEBUG: Available domains: {[d.get('id') for d in domains_data.get('domains', [])]}")
             raise HTTPException(status_code=404, detail="Domain not found")
         
-        print(f"DEBUG: Found domain: {domain}")
-        
-        # Get DNS records for the domain
-        print(f"DEBUG: Fetching DNS records for domain {domain.get('name')} (ID: {domain_id})")
-        records = await dynu_api.get_domain_records(domain_id)
-        print(f"DEBUG: Retrieved {len(records)} records")
+        print(f"DEBUG: Retrieved {len(records)} records for domain {domain.get('name')} (ID: {domain_id})")
         
-        return templates.TemplateResponse("domain_records.html", {
+        digest = dynu_api.cached_records_digest(domain_id)
+        etag = page_etag(request, current_user, digest, *account_parts) if digest and not pending_flash else None
+        return stream_template("domain_records.html", {
             "request": request,
             "user": current_user,
             "account": account,
@@ -391,7 +693,7 @@ async def domain_records_page(
             "domain_id": domain_id,
             "account_id": account_id,
             "messages": get_flashed_messages(request)
-        })
+        }, headers=etag_headers(etag))
         
     except HTTPException:
         raise
@@ -418,7 +720,7 @@ async def add_dns_record(
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    dynu_api = DynuAPI(account.api_key)
+    dynu_api = DynuAPI(account.api_key, account.id)
     success, error = await dynu_api.add_dns_record(domain_id, record_type, name, value, priority, ttl)
 
     if success:
@@ -441,7 +743,7 @@ async def delete_dns_record(
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    dynu_api = DynuAPI(account.api_key)
+    dynu_api = DynuAPI(account.api_key, account.id)
     success = await dynu_api.delete_dns_record(domain_id, record_id)
 
     if success:
@@ -470,38 +772,77 @@ async def bulk_add_dns_records(
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    dynu_api = DynuAPI(account.api_key)
-    success_count = 0
-    error_count = 0
-    errors = []
-
-    # Get domain names for logging
-    domains_data = await dynu_api.get_domains()
-    domain_names = {d.get("id"): d.get("name") for d in domains_data.get("domains", [])}
-
-    for domain_id in domain_ids:
-        try:
-            success, error = await dynu_api.add_dns_record(domain_id, record_type, name, value, priority, ttl, state=state)
-            if success:
-                success_count += 1
-                print(f"Successfully added {record_type} record to domain {domain_names.get(domain_id, domain_id)}")
-            else:
-                error_count += 1
-                domain_name = domain_names.get(domain_id, f"ID:{domain_id}")
-                error_msg = f"Failed to add record to {domain_name}: {error}"
-                errors.append(error_msg)
-                print(error_msg)
-        except Exception as e:
-            error_count += 1
-            domain_name = domain_names.get(domain_id, f"ID:{domain_id}")
-            error_msg = f"Exception adding record to {domain_name}: {str(e)}"
-            errors.append(error_msg)
-            print(error_msg)
+    dynu_api = DynuAPI(account.api_key, account.id)
+    result = await bulk_add_records(dynu_api, domain_ids, record_type, name, value, priority, ttl, state=state)
 
+    if wants_json(request):
+        return JSONResponse(result.to_dict())
+    success_count = result.count(CREATED)
+    error_count = result.count(FAILED)
     if success_count > 0:
         set_flash(request, f"Successfully added {record_type} records to {success_count} domain(s)", "success")
     if error_count > 0:
         set_flash(request, f"Failed to add records to {error_count} domain(s)", "error")
-        request.session["bulk_record_errors"] = errors
+    request.session["bulk_report"] = result.to_session()
 
-    return RedirectResponse(url=f"/domains/{account_id}", status_code=status.HTTP_302_FOUND)
\ No newline at end of file
+    return RedirectResponse(url=f"/domains/{account_id}", status_code=status.HTTP_302_FOUND)
+
+@router.post("/domains/{account_id}/import-zone")
+async def import_zone_files(
+    request: Request,
+    account_id: int,
+    zone_file: UploadFile = File(...),
+    origin: str = Form(""),
+    dry_run: bool = Form(False),
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: Session = Depends(get_db)
+):
+    """Add the records of uploaded BIND zone files (single files or zip/tar archives) to matching domains"""
+    account = db.query(Account).filter(Account.id == account_id, Account.user_id == current_user.id).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+
+    dynu_api = DynuAPI(account.api_key, account.id)
+    sources = zone_sources(zone_file.filename or "zone", zone_file.file)
+    report = await import_zones(dynu_api, sources, origin.strip() or None, dry_run)
+
+    if wants_json(request):
+        return JSONResponse(report.to_dict())
+    counts = ", ".join(f"{count} {name}" for name, count in report.counts.items()) or "no records found"
+    failed = report.counts.get(FAILED, 0)
+    set_flash(request, f"{'Dry run of zone import' if dry_run else 'Zone import'}: {counts}", "error" if failed else "success")
+    request.session["bulk_report"] = report.to_session()
+    return RedirectResponse(url=f"/domains/{account_id}", status_code=status.HTTP_302_FOUND)
+
+# Declarative record management: desired record sets in, minimal create/update/delete plan out
+@router.post("/api/records/{account_id}/plan")
+async def plan_dns_records(
+    account_id: int,
+    spec: RecordPlanRequest,
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: Session = Depends(get_db)
+):
+    """Changes needed to make the given domains carry exactly the desired records (nothing is changed)"""
+    account = db.query(Account).filter(Account.id == account_id, Account.user_id == current_user.id).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    plan = await build_plan(DynuAPI(account.api_key, account.id), spec)
+    return plan.to_dict()
+
+@router.post("/api/records/{account_id}/apply")
+async def apply_dns_records(
+    account_id: int,
+    spec: RecordPlanRequest,
+    current_user: User = Depends(get_current_user_from_cookie),
+    db: Session = Depends(get_db)
+):
+    """Plan and apply a desired record spec; with `plan_id`, only if the plan is still the one reviewed"""
+    account = db.query(Account).filter(Account.id == account_id, Account.user_id == current_user.id).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    dynu_api = DynuAPI(account.api_key, account.id)
+    plan = await build_plan(dynu_api, spec)
+    if spec.plan_id and spec.plan_id != plan.plan_id:
+        return JSONResponse({"error": "Records changed since the plan was made", "plan": plan.to_dict()}, status_code=409)
+    result = await apply_plan(dynu_api, plan)
+    return {"plan": plan.to_dict(), "result": result.to_dict()}
\ No newline at end of file
@@ -0,0 +1,340 @@
+import asyncio
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from models import SessionLocal, Account, SyncSchedule
+from mirror import SyncReport, run_db, sync_account, sync_states
+import metrics
+
+# Identifies this worker process in lease rows
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def jittered(seconds: float) -> float:
+    spread = seconds * settings.SYNC_JITTER
+    return max(1.0, seconds + random.uniform(-spread, spread))
+
+
+# Schedule rows (plain functions, run in a worker thread)
+
+def ensure_schedule(interval: float) -> int:
+    """Add schedule rows for new accounts and drop rows of deleted ones.
+
+    New accounts are staggered SYNC_STAGGER seconds apart, and accounts whose
+    mirror is still recent wait until it is due, so a restart does not make
+    every account refresh at once.
+    """
+    db = SessionLocal()
+    try:
+        account_ids = [account_id for (account_id,) in db.query(Account.id).order_by(Account.id)]
+        scheduled = {account_id for (account_id,) in db.query(SyncSchedule.account_id)}
+        missing = [account_id for account_id in account_ids if account_id not in scheduled]
+        gone = scheduled.difference(account_ids)
+        if gone:
+            db.query(SyncSchedule).filter(SyncSchedule.account_id.in_(gone)).delete(synchronize_session=False)
+        now = datetime.utcnow()
+        states = sync_states(missing) if missing else {}
+        for position, account_id in enumerate(missing):
+            next_run = now + timedelta(seconds=position * settings.SYNC_STAGGER + random.uniform(0, settings.SYNC_STAGGER))
+            synced_at = states.get(account_id, {}).get("records_synced_at")
+            if synced_at is not None:
+                next_run = max(next_run, synced_at + timedelta(seconds=jittered(interval)))
+            db.add(SyncSchedule(account_id=account_id, next_run_at=next_run))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker added the same rows first
+            db.rollback()
+        return len(missing)
+    finally:
+        db.close()
+
+
+def claim_due(owner: str, limit: int, lease_seconds: float) -> List[int]:
+    """Take the lease of up to `limit` due accounts; a lease is only taken when free or expired"""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        lease_free = or_(SyncSchedule.lease_owner.is_(None), SyncSchedule.lease_expires_at < now)
+        due = [
+            account_id for (account_id,) in db.query(SyncSchedule.account_id)
+            .filter(SyncSchedule.next_run_at <= now, lease_free)
+            .order_by(SyncSchedule.next_run_at)
+            .limit(limit)
+        ]
+        claimed = []
+        for account_id in due:
+            # Conditional UPDATE: when two workers race for an account, only one matches the row
+            taken = db.query(SyncSchedule).filter(SyncSchedule.account_id == account_id, lease_free).update({
+                "lease_owner": owner,
+                "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                "last_started_at": now,
+            }, synchronize_session=False)
+            db.commit()
+            if taken:
+                claimed.append(account_id)
+        return claimed
+    finally:
+        db.close()
+
+
+def claim_account(owner: str, account_id: int, lease_seconds: float) -> bool:
+    """Take one account's lease whether or not it is due (manual and dashboard syncs); False while it is held"""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        if db.get(SyncSchedule, account_id) is None:
+            db.add(SyncSchedule(account_id=account_id, next_run_at=now))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+        lease_free = or_(SyncSchedule.lease_owner.is_(None), SyncSchedule.lease_expires_at < now)
+        taken = db.query(SyncSchedule).filter(SyncSchedule.account_id == account_id, lease_free).update({
+            "lease_owner": owner,
+            "lease_expires_at": now + timedelta(seconds=lease_seconds),
+            "last_started_at": now,
+        }, synchronize_session=False)
+        db.commit()
+        return bool(taken)
+    finally:
+        db.close()
+
+
+def renew_leases(owner: str, account_ids: List[int], lease_seconds: float):
+    db = SessionLocal()
+    try:
+        db.query(SyncSchedule).filter(
+            SyncSchedule.account_id.in_(account_ids), SyncSchedule.lease_owner == owner
+        ).update({"lease_expires_at": datetime.utcnow() + timedelta(seconds=lease_seconds)}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def finish_run(owner: str, account_id: int, status: str, message: Optional[str], next_run_at: datetime):
+    db = SessionLocal()
+    try:
+        db.query(SyncSchedule).filter(
+            SyncSchedule.account_id == account_id, SyncSchedule.lease_owner == owner
+        ).update({
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "last_finished_at": datetime.utcnow(),
+            "last_status": status,
+            "last_message": (message or "")[:500] or None,
+            "next_run_at": next_run_at,
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def release_leases(owner: str):
+    """Give up every lease of this worker (at shutdown) so another worker can take over at once"""
+    db = SessionLocal()
+    try:
+        db.query(SyncSchedule).filter(SyncSchedule.lease_owner == owner).update(
+            {"lease_owner": None, "lease_expires_at": None}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def account_key(account_id: int) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        row = db.query(Account.api_key).filter(Account.id == account_id).first()
+        return row[0] if row else None
+    finally:
+        db.close()
+
+
+def schedule_states(account_ids: Iterable[int]) -> Dict[int, dict]:
+    """Last and next run per account, for the dashboard"""
+    account_ids = list(account_ids)
+    if not account_ids:
+        return {}
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        return {
+            row.account_id: {
+                "next_run_at": row.next_run_at,
+                "last_finished_at": row.last_finished_at,
+                "last_status": row.last_status,
+                "last_message": row.last_message,
+                "running": row.lease_owner is not None and row.lease_expires_at is not None and row.lease_expires_at >= now,
+            }
+            for row in db.query(SyncSchedule).filter(SyncSchedule.account_id.in_(account_ids))
+        }
+    finally:
+        db.close()
+
+
+class SyncScheduler:
+    """Refreshes every account's mirror in the background, started by the app lifespan.
+
+    Every worker runs a scheduler, but an account is only synced by the worker
+    holding its lease in sync_schedule. Leases are renewed while a sync runs
+    and expire on their own if the worker dies, so another worker takes over.
+    """
+
+    def __init__(self, interval: float, concurrency: int, lease_seconds: float, tick: float):
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.tick_seconds = tick
+        self._loop_task: Optional[asyncio.Task] = None
+        self._running: Dict[int, asyncio.Task] = {}
+        self._manual: Set[asyncio.Task] = set()  # "Sync now" runs, which tick() does not count
+
+    @property
+    def started(self) -> bool:
+        return self._loop_task is not None and not self._loop_task.done()
+
+    def start(self):
+        if not settings.MIRROR_ENABLED:
+            print("DEBUG: Sync scheduler not started: the mirror is disabled")
+            return
+        if not self.started:
+            self._loop_task = asyncio.ensure_future(self._loop())
+            print(f"DEBUG: Sync scheduler started on {WORKER_ID} (every {self.interval:.0f}s)")
+
+    async def stop(self):
+        tasks = list(self._running.values()) + list(self._manual)
+        if self._loop_task is not None:
+            tasks.append(self._loop_task)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+        try:
+            await run_db(release_leases, WORKER_ID)
+        except Exception as e:
+            print(f"WARNING: Could not release sync leases: {type(e).__name__}: {e}")
+
+    async def _loop(self):
+        # Workers start at slightly different moments; the first tick is jittered too
+        await asyncio.sleep(random.uniform(0, self.tick_seconds))
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"WARNING: Sync scheduler tick failed: {type(e).__name__}: {e}")
+            await asyncio.sleep(jittered(self.tick_seconds))
+
+    async def tick(self) -> List[int]:
+        """Renew held leases and start syncs for due accounts this worker can claim"""
+        await run_db(ensure_schedule, self.interval)
+        if self._running:
+            await run_db(renew_leases, WORKER_ID, list(self._running), self.lease_seconds)
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return []
+        claimed = await run_db(claim_due, WORKER_ID, free, self.lease_seconds)
+        for account_id in claimed:
+            task = asyncio.ensure_future(self._sync(account_id))
+            self._running[account_id] = task
+            task.add_done_callback(lambda _, account_id=account_id: self._running.pop(account_id, None))
+        return claimed
+
+    async def run_now(self, account_id: int, api_key: str, force: bool = False) -> Optional[SyncReport]:
+        """Sync one account at once (dashboard refresh) under its lease.
+
+        Returns None without syncing when another sync of the account holds the
+        lease, whether on this worker or another one.
+        """
+        if not await run_db(claim_account, WORKER_ID, account_id, self.lease_seconds):
+            return None
+        return await self._run_claimed(account_id, api_key, force)
+
+    async def start_now(self, account_id: int, api_key: str, force: bool = False) -> Optional[asyncio.Task]:
+        """Start a sync of one account in the background ("Sync now"); None when one is already running.
+
+        The lease is taken before returning, so the dashboard shows the sync as
+        running from the next page view on.
+        """
+        if not await run_db(claim_account, WORKER_ID, account_id, self.lease_seconds):
+            return None
+        task = asyncio.ensure_future(self._run_claimed(account_id, api_key, force))
+        self._manual.add(task)
+        task.add_done_callback(self._manual_done)
+        return task
+
+    def _manual_done(self, task: asyncio.Task):
+        self._manual.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            print(f"WARNING: Manual sync failed: {type(error).__name__}: {error}")
+
+    async def _run_claimed(self, account_id: int, api_key: str, force: bool) -> SyncReport:
+        keeper = asyncio.ensure_future(self._keep_lease(account_id))
+        status, message = "error", None
+        try:
+            report = await sync_account(account_id, api_key, force=force)
+            status = "error" if report.error else "ok"
+            message = report.summary()
+            return report
+        except Exception as e:
+            message = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            keeper.cancel()
+            next_run = datetime.utcnow() + timedelta(seconds=jittered(self.interval))
+            await run_db(finish_run, WORKER_ID, account_id, status, message, next_run)
+
+    async def _keep_lease(self, account_id: int):
+        """Renew the lease of a sync started outside tick(), which only renews its own"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await run_db(renew_leases, WORKER_ID, [account_id], self.lease_seconds)
+            except Exception as e:
+                print(f"WARNING: Could not renew the sync lease of account {account_id}: {type(e).__name__}: {e}")
+
+    async def _sync(self, account_id: int):
+        now = datetime.utcnow()
+        status, message = "error", None
+        try:
+            api_key = await run_db(account_key, account_id)
+            if api_key is None:
+                return  # Account deleted; its schedule row goes on the next tick
+            synced_at = (await run_db(sync_states, [account_id])).get(account_id, {}).get("records_synced_at")
+            if synced_at is not None and now - synced_at < timedelta(seconds=self.interval / 2):
+                # Synced recently by hand ("Sync now"); just move the next run
+                status, message = "skipped", "Synced recently"
+                metrics.incr("scheduler.skipped")
+                await run_db(finish_run, WORKER_ID, account_id, status, message,
+                             synced_at + timedelta(seconds=jittered(self.interval)))
+                return
+            report = await sync_account(account_id, api_key)
+            status = "error" if report.error else "ok"
+            message = report.summary()
+            metrics.incr(f"scheduler.{status}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            message = f"{type(e).__name__}: {e}"
+            print(f"WARNING: Scheduled sync of account {account_id} failed: {message}")
+            metrics.incr("scheduler.error")
+        next_run = datetime.utcnow() + timedelta(seconds=jittered(self.interval))
+        await run_db(finish_run, WORKER_ID, account_id, status, message, next_run)
+
+
+scheduler = SyncScheduler(
+    interval=settings.SYNC_INTERVAL,
+    concurrency=settings.SYNC_CONCURRENCY,
+    lease_seconds=settings.SYNC_LEASE_SECONDS,
+    tick=settings.SYNC_TICK_SECONDS,
+)
@@ -0,0 +1,190 @@
+import ipaddress
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+MATCH_MODES = ("contains", "prefix", "exact")
+STATE_FILTERS = ("on", "off")
+# Sort parameter name -> Dynu domain attribute
+SORT_FIELDS = {
+    "name": "name",
+    "id": "id",
+    "state": "state",
+    "ipv4": "ipv4Address",
+    "ipv6": "ipv6Address",
+    "updated": "updatedOn",
+}
+
+
+def parse_sort(spec: Optional[str]) -> Tuple[Tuple[str, bool], ...]:
+    """"state,-updated" -> (("state", False), ("updated", True)); unknown fields are ignored"""
+    keys = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        descending = part.startswith("-")
+        field = part.lstrip("-+")
+        if field in SORT_FIELDS and field not in (k for k, _ in keys):
+            keys.append((field, descending))
+    return tuple(keys)
+
+
+def _sort_value(field: str, value):
+    if field == "ipv4" or field == "ipv6":
+        try:
+            return (0, int(ipaddress.ip_address(value)))
+        except ValueError:
+            return (1, 0)  # Missing or invalid addresses sort last
+    if field == "id":
+        return value if isinstance(value, int) else -1
+    if field == "state":
+        return 1 if value else 0
+    return (value or "").lower() if isinstance(value, str) else ""
+
+
+def trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class DomainSearchIndex:
+    """Search index over one cached domain list, built once per list version.
+
+    - exact:    hash lookup on the lowercased name
+    - prefix:   binary search over the sorted names
+    - contains: trigram posting lists, intersected smallest-first, then verified
+
+    Attribute filters use per-value indexes (state, IPv4, IPv6) and a sorted
+    updatedOn list for date ranges. Sorting uses dense rank arrays built once
+    per field, so multi-key sorts compare small integer tuples.
+
+    Results are positions into the original list, returned in list order so
+    pagination over search results is stable.
+    """
+
+    def __init__(self, domains: List[dict]):
+        self.domains = [d if isinstance(d, dict) else {"name": str(d)} for d in domains]
+        self.names: List[str] = [(d.get("name") or "").lower() for d in self.domains]
+        self._by_state: Dict[str, List[int]] = {"on": [], "off": []}
+        self._by_ipv4: Dict[str, List[int]] = {}
+        self._by_ipv6: Dict[str, List[int]] = {}
+        for position, domain in enumerate(self.domains):
+            self._by_state["on" if domain.get("state", True) else "off"].append(position)
+            if domain.get("ipv4Address"):
+                self._by_ipv4.setdefault(domain["ipv4Address"], []).append(position)
+            if domain.get("ipv6Address"):
+                self._by_ipv6.setdefault(domain["ipv6Address"].lower(), []).append(position)
+        self._updated: Optional[List[Tuple[str, int]]] = None
+        self._ranks: Dict[str, List[int]] = {}
+        self._exact: Dict[str, List[int]] = {}
+        self._trigrams: Dict[str, List[int]] = {}
+        for position, name in enumerate(self.names):
+            self._exact.setdefault(name, []).append(position)
+            for gram in trigrams(name):
+                self._trigrams.setdefault(gram, []).append(position)
+        self._sorted: List[Tuple[str, int]] = sorted((name, position) for position, name in enumerate(self.names))
+
+    def exact(self, query: str) -> List[int]:
+        return list(self._exact.get(query, []))
+
+    def prefix(self, query: str) -> List[int]:
+        positions = []
+        start = bisect_left(self._sorted, (query, -1))
+        for name, position in self._sorted[start:]:
+            if not name.startswith(query):
+                break
+            positions.append(position)
+        return sorted(positions)
+
+    def contains(self, query: str) -> List[int]:
+        if len(query) < 3:
+            # Too short for trigrams; such queries match a large share of names anyway
+            return [position for position, name in enumerate(self.names) if query in name]
+        postings = sorted((self._trigrams.get(gram, []) for gram in trigrams(query)), key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return sorted(position for position in candidates if query in self.names[position])
+
+    def search(self, query: str, mode: str = "contains") -> List[int]:
+        query = query.strip().lower()
+        if not query:
+            return list(range(len(self.names)))
+        if mode == "exact":
+            return self.exact(query)
+        if mode == "prefix":
+            return self.prefix(query)
+        return self.contains(query)
+
+    def state(self, value: str) -> List[int]:
+        return list(self._by_state.get(value, []))
+
+    def ipv4(self, address: str) -> List[int]:
+        return list(self._by_ipv4.get(address.strip(), []))
+
+    def ipv6(self, address: str) -> List[int]:
+        return list(self._by_ipv6.get(address.strip().lower(), []))
+
+    def updated_between(self, after: Optional[str] = None, before: Optional[str] = None) -> List[int]:
+        """Positions with after <= updatedOn < before (ISO strings compare in date order)"""
+        if self._updated is None:
+            self._updated = sorted(
+                (d.get("updatedOn") or "", position) for position, d in enumerate(self.domains) if d.get("updatedOn")
+            )
+        start = bisect_left(self._updated, (after, -1)) if after else 0
+        end = bisect_left(self._updated, (before, -1)) if before else len(self._updated)
+        return sorted(position for _, position in self._updated[start:end])
+
+    def ranks(self, field: str) -> List[int]:
+        """Dense rank of every position for one sort field (equal values share a rank)"""
+        if field not in self._ranks:
+            attribute = SORT_FIELDS[field]
+            values = [_sort_value(field, d.get(attribute)) for d in self.domains]
+            distinct = {value: rank for rank, value in enumerate(sorted(set(values)))}
+            self._ranks[field] = [distinct[value] for value in values]
+        return self._ranks[field]
+
+    def sort(self, positions: List[int], keys: Tuple[Tuple[str, bool], ...]) -> List[int]:
+        """Order positions by several (field, descending) keys; ties keep list order"""
+        if not keys:
+            return positions
+        columns = [(self.ranks(field), descending) for field, descending in keys]
+        if len(columns) == 1:
+            ranks, descending = columns[0]
+            if descending:
+                return sorted(positions, key=lambda p: -ranks[p])
+            return sorted(positions, key=ranks.__getitem__)
+        return sorted(positions, key=lambda p: tuple(-r[p] if desc else r[p] for r, desc in columns))
+
+    def query(
+        self,
+        search: Optional[str] = None,
+        match: str = "contains",
+        filters: Optional[Dict[str, str]] = None,
+        sort: Tuple[Tuple[str, bool], ...] = (),
+    ) -> List[int]:
+        """Search, attribute filters and sort combined; filters are intersected smallest-first"""
+        filters = filters or {}
+        candidates = []
+        if search and search.strip():
+            candidates.append(self.search(search, match))
+        if filters.get("state") in STATE_FILTERS:
+            candidates.append(self.state(filters["state"]))
+        if filters.get("ipv4"):
+            candidates.append(self.ipv4(filters["ipv4"]))
+        if filters.get("ipv6"):
+            candidates.append(self.ipv6(filters["ipv6"]))
+        if filters.get("updated_after") or filters.get("updated_before"):
+            candidates.append(self.updated_between(filters.get("updated_after"), filters.get("updated_before")))
+        if not candidates:
+            positions = list(range(len(self.domains)))
+        else:
+            candidates.sort(key=len)
+            selected = set(candidates[0])
+            for other in candidates[1:]:
+                if not selected:
+                    break
+                selected.intersection_update(other)
+            positions = sorted(selected)
+        return self.sort(positions, sort)
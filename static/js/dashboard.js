@@ -0,0 +1,41 @@
+// While any account's stats are being refreshed in the background, poll the
+// stats endpoint and update the table in place.
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text == null ? '' : String(text);
+    return div.innerHTML.replace(/"/g, '&quot;');
+}
+
+async function pollDashboardStats() {
+    const response = await fetch('/api/dashboard/stats');
+    if (!response.ok) return;
+    const data = await response.json();
+    let totalDomains = 0;
+    let totalRecords = 0;
+    let refreshing = false;
+    Object.entries(data.accounts).forEach(([accountId, stats]) => {
+        const row = document.querySelector(`#accountStats tr[data-account-id="${accountId}"]`);
+        const synced = stats.synced_at !== 'never';
+        totalDomains += stats.domain_count;
+        totalRecords += stats.record_count;
+        refreshing = refreshing || stats.refreshing;
+        if (!row) return;
+        row.querySelector('.stat-domains').textContent = synced ? stats.domain_count : '-';
+        row.querySelector('.stat-records').textContent = synced ? stats.record_count : '-';
+        row.querySelector('.stat-synced').innerHTML = escapeHtml(stats.synced_at)
+            + (stats.refreshing ? ' <i class="fas fa-sync fa-spin text-muted" title="Refreshing"></i>' : '')
+            + (stats.error ? ` <i class="fas fa-exclamation-triangle text-warning" title="${escapeHtml(stats.error)}"></i>` : '');
+    });
+    document.getElementById('totalDomains').textContent = totalDomains;
+    document.getElementById('totalRecords').textContent = totalRecords;
+    if (refreshing) {
+        setTimeout(pollDashboardStats, 3000);
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const table = document.getElementById('accountStats');
+    if (table && table.dataset.refreshing === 'true') {
+        setTimeout(pollDashboardStats, 2000);
+    }
+});
@@ -0,0 +1,52 @@
+function updateRecordForm() {
+    const recordType = document.getElementById('record_type').value;
+    const valueField = document.getElementById('value');
+    const valueHelp = document.getElementById('value-help');
+    const priorityField = document.getElementById('priority-field');
+    const recordHelp = document.getElementById('record-help');
+    const helpContent = document.getElementById('help-content');
+    
+    // Reset fields
+    priorityField.style.display = 'none';
+    recordHelp.style.display = 'none';
+    valueField.placeholder = '';
+    
+    switch(recordType) {
+        case 'A':
+            valueField.placeholder = 'e.g., 192.168.1.1';
+            valueHelp.textContent = 'Enter the IPv4 address';
+            helpContent.innerHTML = '<strong>A Record:</strong> Points your domain to an IPv4 address. Use this to direct traffic to your server.';
+            recordHelp.style.display = 'block';
+            break;
+            
+        case 'TXT':
+            valueField.placeholder = 'e.g., "v=spf1 include:_spf.google.com ~all"';
+            valueHelp.textContent = 'Enter the text value';
+            helpContent.innerHTML = '<strong>TXT Record:</strong> Stores text information. Often used for domain verification, SPF records, or other configuration data.';
+            recordHelp.style.display = 'block';
+            break;
+            
+        case 'MX':
+            valueField.placeholder = 'e.g., mail.example.com';
+            valueHelp.textContent = 'Enter the mail server hostname';
+            priorityField.style.display = 'block';
+            helpContent.innerHTML = '<strong>MX Record:</strong> Specifies mail servers for your domain. Lower priority numbers are preferred.';
+            recordHelp.style.display = 'block';
+            break;
+            
+        case 'SPF':
+            valueField.placeholder = 'e.g., "v=spf1 include:_spf.google.com ~all"';
+            valueHelp.textContent = 'Enter the SPF policy';
+            helpContent.innerHTML = '<strong>SPF Record:</strong> Sender Policy Framework record to prevent email spoofing. Stored as a TXT record.';
+            recordHelp.style.display = 'block';
+            break;
+            
+        default:
+            valueHelp.textContent = 'Enter the record value';
+    }
+}
+
+// Initialize form when modal is shown
+document.getElementById('addRecordModal').addEventListener('shown.bs.modal', function () {
+    document.getElementById('record_type').focus();
+});
@@ -0,0 +1,332 @@
+// Virtual scrolling table used for "Show All": keeps every row in memory as compact
+// [id, name, created, state] arrays but only puts the rows in view into the DOM.
+const VirtualDomains = {
+    container: null,
+    body: null,
+    rows: [],
+    selected: new Set(),
+    rowHeight: 41,
+    overscan: 10,
+    total: 0,
+    loaded: false,
+
+    init(container) {
+        this.container = container;
+        this.body = document.getElementById('virtualBody');
+        this.container.addEventListener('scroll', () => this.render());
+        window.addEventListener('resize', () => this.render());
+        this.load(null);
+    },
+
+    params(extra) {
+        // Current search, filters and sort, exactly as the page was requested
+        const params = new URLSearchParams(this.container.dataset.query || '');
+        Object.entries(extra || {}).forEach(([key, value]) => params.set(key, value));
+        return params;
+    },
+
+    async load(cursor) {
+        const params = this.params({limit: 1000});
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`/api/domains/${this.container.dataset.accountId}?${params}`);
+        if (!response.ok) {
+            document.getElementById('virtualStatus').textContent = 'Failed to load domains';
+            return;
+        }
+        const data = await response.json();
+        this.rows.push(...data.rows);
+        this.total = data.total;
+        this.loaded = !data.next_cursor;
+        document.getElementById('virtualStatus').textContent = this.loaded
+            ? `Showing all ${this.rows.length} domains`
+            : `Loaded ${this.rows.length} of ${this.total} domains...`;
+        this.render();
+        if (data.next_cursor) this.load(data.next_cursor);
+    },
+
+    render() {
+        const first = Math.max(0, Math.floor(this.container.scrollTop / this.rowHeight) - this.overscan);
+        const visible = Math.ceil(this.container.clientHeight / this.rowHeight) + 2 * this.overscan;
+        const last = Math.min(this.rows.length, first + visible);
+        const accountId = this.container.dataset.accountId;
+        let html = `<tr style="height: ${first * this.rowHeight}px"></tr>`;
+        for (let i = first; i < last; i++) {
+            const [id, name, created, state] = this.rows[i];
+            html += `<tr>
+                <td><input type="checkbox" class="domain-checkbox" value="${id}" data-name="${escapeHtml(name)}"
+                           ${this.selected.has(id) ? 'checked' : ''} onchange="VirtualDomains.toggle(${id}, this.checked)"></td>
+                <td>${escapeHtml(name)}</td>
+                <td>${state === false
+                    ? '<span class="badge bg-secondary">Disabled</span>'
+                    : '<span class="badge bg-success">Active</span>'}</td>
+                <td>${created ? escapeHtml(created) : 'N/A'}</td>
+                <td>
+                    <a href="/domains/${accountId}/${id}/records" class="btn btn-primary btn-sm me-1" title="Manage DNS Records">
+                        <i class="fas fa-cog"></i> Records
+                    </a>
+                    <button type="button" class="btn btn-danger btn-sm" onclick="deleteSingle('${id}')">
+                        <i class="fas fa-trash"></i>
+                    </button>
+                </td>
+            </tr>`;
+        }
+        html += `<tr style="height: ${(this.rows.length - last) * this.rowHeight}px"></tr>`;
+        this.body.innerHTML = html;
+        const sample = this.body.rows[1];
+        if (sample && sample.offsetHeight && sample.offsetHeight !== this.rowHeight) {
+            this.rowHeight = sample.offsetHeight;
+        }
+    },
+
+    toggle(id, checked) {
+        if (checked) this.selected.add(id); else this.selected.delete(id);
+        updateDeleteButton();
+    },
+
+    async selectAll(checked) {
+        if (!checked) {
+            this.selected.clear();
+        } else {
+            // Select every matching domain, including rows that have not loaded yet
+            const response = await fetch(`/api/domains/${this.container.dataset.accountId}/ids?${this.params()}`);
+            const data = await response.json();
+            data.ids.forEach(id => this.selected.add(id));
+        }
+        this.render();
+        updateDeleteButton();
+    },
+
+    selectedNames() {
+        const names = new Map(this.rows.map(([id, name]) => [id, name]));
+        return Array.from(this.selected, id => names.get(id) || `ID:${id}`);
+    }
+};
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text == null ? '' : String(text);
+    return div.innerHTML.replace(/"/g, '&quot;');
+}
+
+function isVirtual() {
+    return VirtualDomains.container !== null;
+}
+
+function getSelectedIds() {
+    if (isVirtual()) return Array.from(VirtualDomains.selected);
+    return Array.from(document.querySelectorAll('.domain-checkbox:checked'), checkbox => checkbox.value);
+}
+
+function getSelectedNames() {
+    if (isVirtual()) return VirtualDomains.selectedNames();
+    return Array.from(document.querySelectorAll('.domain-checkbox:checked'), checkbox => {
+        const row = checkbox.closest('tr');
+        const nameCell = row.querySelector('td:nth-child(2)');
+        return nameCell ? nameCell.textContent.trim() : 'Unknown';
+    });
+}
+
+function toggleAll() {
+    const selectAll = document.getElementById('selectAll');
+    if (isVirtual()) {
+        VirtualDomains.selectAll(selectAll.checked);
+        return;
+    }
+    const checkboxes = document.querySelectorAll('.domain-checkbox');
+    
+    checkboxes.forEach(checkbox => {
+        checkbox.checked = selectAll.checked;
+    });
+    
+    updateDeleteButton();
+}
+
+function updateDeleteButton() {
+    const selectedIds = getSelectedIds();
+    const deleteBtn = document.getElementById('deleteBtn');
+    const bulkRecordsBtn = document.getElementById('bulkRecordsBtn');
+    
+    if (selectedIds.length > 0) {
+        deleteBtn.style.display = 'inline-block';
+        bulkRecordsBtn.style.display = 'inline-block';
+        updateSelectedDomains();
+    } else {
+        deleteBtn.style.display = 'none';
+        bulkRecordsBtn.style.display = 'none';
+    }
+}
+
+function updateSelectedDomains() {
+    const selectedIds = getSelectedIds();
+    const selectedDomainsCount = document.getElementById('selectedDomainsCount');
+    const selectedDomainsDisplay = document.getElementById('selectedDomainsDisplay');
+    const selectedDomainInputs = document.getElementById('selectedDomainInputs');
+    
+    if (selectedDomainsCount) {
+        selectedDomainsCount.textContent = selectedIds.length;
+    }
+    
+    // Clear previous inputs
+    if (selectedDomainInputs) {
+        selectedDomainInputs.innerHTML = '';
+    }
+    
+    // Add hidden inputs for each selected domain
+    selectedIds.forEach(id => {
+        const input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = 'domain_ids';
+        input.value = id;
+        if (selectedDomainInputs) {
+            selectedDomainInputs.appendChild(input);
+        }
+    });
+    
+    // Update display with domain names
+    if (selectedDomainsDisplay && selectedIds.length > 0) {
+        const domainNames = getSelectedNames();
+        const shown = domainNames.slice(0, 100).map(escapeHtml).join(', ');
+        const more = domainNames.length > 100 ? ` and ${domainNames.length - 100} more` : '';
+        
+        selectedDomainsDisplay.innerHTML = `
+            <strong>${selectedIds.length} domain(s) selected:</strong><br>
+            <small>${shown}${more}</small>
+        `;
+    }
+}
+
+function updateBulkRecordForm() {
+    const recordType = document.getElementById('bulk_record_type').value;
+    const valueField = document.getElementById('bulk_value');
+    const valueHelp = document.getElementById('bulk-value-help');
+    const priorityField = document.getElementById('bulk-priority-field');
+    const recordHelp = document.getElementById('bulk-record-help');
+    const helpContent = document.getElementById('bulk-help-content');
+    
+    // Reset fields
+    priorityField.style.display = 'none';
+    recordHelp.style.display = 'none';
+    valueField.placeholder = '';
+    
+    switch(recordType) {
+        case 'A':
+            valueField.placeholder = 'e.g., 192.168.1.1';
+            valueHelp.textContent = 'Enter the IPv4 address';
+            helpContent.innerHTML = '<strong>A Record:</strong> Points your domains to an IPv4 address. This will be added to all selected domains.';
+            recordHelp.style.display = 'block';
+            break;
+            
+        case 'TXT':
+            valueField.placeholder = 'e.g., "v=spf1 include:_spf.google.com ~all"';
+            valueHelp.textContent = 'Enter the text value';
+            helpContent.innerHTML = '<strong>TXT Record:</strong> Stores text information. This will be added to all selected domains.';
+            recordHelp.style.display = 'block';
+            break;
+            
+        case 'MX':
+            valueField.placeholder = 'e.g., mail.example.com';
+            valueHelp.textContent = 'Enter the mail server hostname';
+            priorityField.style.display = 'block';
+            helpContent.innerHTML = '<strong>MX Record:</strong> Specifies mail servers for your domains. This will be added to all selected domains.';
+            recordHelp.style.display = 'block';
+            break;
+            
+        case 'SPF':
+            valueField.placeholder = 'e.g., "v=spf1 include:_spf.google.com ~all"';
+            valueHelp.textContent = 'Enter the SPF policy';
+            helpContent.innerHTML = '<strong>SPF Record:</strong> Sender Policy Framework record to prevent email spoofing. This will be added to all selected domains.';
+            recordHelp.style.display = 'block';
+            break;
+            
+        default:
+            valueHelp.textContent = 'Enter the record value';
+    }
+}
+
+function deleteSelected() {
+    const selectedIds = getSelectedIds();
+    if (selectedIds.length === 0) {
+        alert('Please select at least one domain to delete.');
+        return;
+    }
+    
+    if (confirm('Are you sure you want to delete ' + selectedIds.length + ' domain(s)?')) {
+        if (isVirtual()) {
+            const inputs = document.getElementById('selectedDeleteInputs');
+            inputs.innerHTML = '';
+            selectedIds.forEach(id => {
+                const input = document.createElement('input');
+                input.type = 'hidden';
+                input.name = 'domain_ids';
+                input.value = id;
+                inputs.appendChild(input);
+            });
+        }
+        document.getElementById('deleteForm').submit();
+    }
+}
+
+function deleteSingle(domainId) {
+    if (confirm('Are you sure you want to delete this domain?')) {
+        // Create a temporary form for single domain deletion
+        const form = document.createElement('form');
+        form.method = 'post';
+        form.action = document.getElementById('deleteForm').action;
+        
+        const input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = 'domain_ids';
+        input.value = domainId;
+        
+        form.appendChild(input);
+        document.body.appendChild(form);
+        form.submit();
+    }
+}
+
+// Search functionality
+document.addEventListener('DOMContentLoaded', function() {
+    const virtualContainer = document.getElementById('virtualDomains');
+    if (virtualContainer) {
+        VirtualDomains.init(virtualContainer);
+    }
+    
+    const searchInput = document.getElementById('searchInput');
+    if (searchInput) {
+        // Auto-submit search form on Enter key
+        searchInput.addEventListener('keypress', function(e) {
+            if (e.key === 'Enter') {
+                e.preventDefault();
+                this.form.submit();
+            }
+        });
+        
+        // Focus search input if there's a search term
+        if (searchInput.value) {
+            searchInput.focus();
+            searchInput.setSelectionRange(searchInput.value.length, searchInput.value.length);
+        }
+    }
+    
+    // Custom subdomain preview functionality
+    const subdomainInput = document.getElementById('subdomain_name');
+    const mainDomainSelect = document.getElementById('custom_main_domain');
+    const subdomainPart = document.getElementById('subdomain-part');
+    const maindomainPart = document.getElementById('maindomain-part');
+    
+    function updatePreview() {
+        const subdomain = subdomainInput ? subdomainInput.value || 'your-subdomain' : 'your-subdomain';
+        const mainDomain = mainDomainSelect ? mainDomainSelect.value || 'select-domain' : 'select-domain';
+        
+        if (subdomainPart) subdomainPart.textContent = subdomain;
+        if (maindomainPart) maindomainPart.textContent = mainDomain;
+    }
+    
+    if (subdomainInput) {
+        subdomainInput.addEventListener('input', updatePreview);
+    }
+    
+    if (mainDomainSelect) {
+        mainDomainSelect.addEventListener('change', updatePreview);
+    }
+});
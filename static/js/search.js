@@ -0,0 +1,82 @@
+// Cross-account search: reads the NDJSON stream from /api/search and adds each
+// account's matches as soon as that account has answered.
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text == null ? '' : String(text);
+    return div.innerHTML.replace(/"/g, '&quot;');
+}
+
+function renderAccountResult(result) {
+    const body = document.getElementById('globalSearchResults');
+    const account = escapeHtml(result.account_name);
+    if (result.error) {
+        body.insertAdjacentHTML('beforeend', `<tr class="table-warning">
+            <td>${account}</td>
+            <td colspan="2"><i class="fas fa-exclamation-triangle"></i> ${escapeHtml(result.error)}</td>
+        </tr>`);
+        return;
+    }
+    let html = '';
+    result.matches.forEach(domain => {
+        html += `<tr>
+            <td><a href="/domains/${result.account_id}">${account}</a></td>
+            <td>${escapeHtml(domain.name)}</td>
+            <td>
+                <a href="/domains/${result.account_id}/${domain.id}/records" class="btn btn-primary btn-sm" title="Manage DNS Records">
+                    <i class="fas fa-cog"></i> Records
+                </a>
+            </td>
+        </tr>`;
+    });
+    if (result.total > result.matches.length) {
+        const params = new URLSearchParams({search: document.getElementById('globalSearchInput').value,
+                                            match: document.getElementById('globalSearchMatch').value});
+        html += `<tr><td colspan="3" class="text-muted small">
+            ... and ${result.total - result.matches.length} more in
+            <a href="/domains/${result.account_id}?${params}">${account}</a>
+        </td></tr>`;
+    }
+    body.insertAdjacentHTML('beforeend', html);
+}
+
+async function runGlobalSearch(query, match) {
+    const status = document.getElementById('globalSearchStatus');
+    document.getElementById('globalSearchResults').innerHTML = '';
+    status.textContent = 'Searching...';
+
+    const response = await fetch(`/api/search?${new URLSearchParams({q: query, match: match})}`);
+    if (!response.ok || !response.body) {
+        status.textContent = 'Search failed';
+        return;
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let accountsDone = 0;
+    let found = 0;
+    while (true) {
+        const {value, done} = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, {stream: true});
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => {
+            const result = JSON.parse(line);
+            if (result.done) {
+                status.textContent = `${result.total} match(es) in ${result.accounts} account(s), ${result.elapsed}s`;
+                return;
+            }
+            accountsDone += 1;
+            found += result.total || 0;
+            status.textContent = `${found} match(es) so far, ${accountsDone} account(s) searched...`;
+            renderAccountResult(result);
+        });
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const query = document.getElementById('globalSearchInput').value.trim();
+    if (query) {
+        runGlobalSearch(query, document.getElementById('globalSearchMatch').value);
+    }
+});
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import time
+from typing import Iterator, Optional
+
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+
+from config import settings
+from assets import asset_url, GENERATED_SUFFIXES
+
+
+def create_templates() -> Jinja2Templates:
+    """Build the one template environment shared by every route in this worker.
+
+    Compiled templates are kept in a filesystem bytecode cache, so a recycled
+    worker loads them instead of recompiling from source. Templates are not
+    re-checked for changes on disk unless TEMPLATE_AUTO_RELOAD is on.
+    """
+    templates = Jinja2Templates(directory="templates")
+    templates.env.globals["asset_url"] = asset_url
+    templates.env.auto_reload = settings.TEMPLATE_AUTO_RELOAD
+    if settings.TEMPLATE_CACHE_DIR:
+        try:
+            os.makedirs(settings.TEMPLATE_CACHE_DIR, exist_ok=True)
+            templates.env.bytecode_cache = FileSystemBytecodeCache(settings.TEMPLATE_CACHE_DIR)
+        except OSError as e:
+            print(f"WARNING: template bytecode cache disabled ({e})")
+    return templates
+
+
+templates = create_templates()
+
+
+def precompile_templates():
+    """Load every template once so the first request does not pay for compiling them"""
+    started = time.perf_counter()
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.get_template(name)
+    print(f"DEBUG: Precompiled {len(names)} templates in {time.perf_counter() - started:.3f}s")
+
+
+_content_version: Optional[str] = None
+
+
+def content_version() -> str:
+    """Changes whenever a template or static file changes (part of page ETags)"""
+    global _content_version
+    if _content_version is None or settings.TEMPLATE_AUTO_RELOAD:
+        stamps = []
+        for directory in ("templates", "static"):
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    if filename.endswith(GENERATED_SUFFIXES):
+                        continue
+                    stat_result = os.stat(os.path.join(root, filename))
+                    stamps.append(f"{root}/{filename}:{stat_result.st_mtime_ns}:{stat_result.st_size}")
+        _content_version = hashlib.sha1("\n".join(sorted(stamps)).encode()).hexdigest()
+    return _content_version
+
+
+def _chunks(parts: Iterator[str], chunk_size: int, first_chunk_size: int) -> Iterator[bytes]:
+    """Group Jinja's small output fragments into chunks worth a network write.
+
+    The first chunk is flushed early so the page header and controls reach
+    the browser while the table rows are still being rendered.
+    """
+    buffer = []
+    size = 0
+    limit = first_chunk_size
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= limit:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+            limit = chunk_size
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def stream_template(name: str, context: dict, status_code: int = 200, headers: Optional[dict] = None):
+    """Render a template incrementally with Jinja's generate() and stream it.
+
+    Unlike TemplateResponse the page is never held in memory as a whole.
+    Rendering is synchronous, so Starlette runs the generator in its thread pool.
+    Set TEMPLATE_STREAMING=false to fall back to buffered rendering.
+    """
+    if not settings.TEMPLATE_STREAMING:
+        return templates.TemplateResponse(name, context, status_code=status_code, headers=headers)
+    template = templates.get_template(name)
+    parts = template.generate(context)
+    return StreamingResponse(
+        _chunks(parts, settings.TEMPLATE_STREAM_CHUNK_SIZE, settings.TEMPLATE_STREAM_FIRST_CHUNK_SIZE),
+        status_code=status_code,
+        headers=headers,
+        media_type="text/html; charset=utf-8",
+    )
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Point the app at throwaway databases before any module reads config.settings
+_data_dir = tempfile.mkdtemp(prefix="dns-management-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_data_dir}/test.db")
+os.environ.setdefault("RATE_LIMIT_DB", os.path.join(_data_dir, "rate_limit.db"))
+os.environ.setdefault("SYNC_SCHEDULER_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
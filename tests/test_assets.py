@@ -0,0 +1,15 @@
+import pytest
+
+from assets import check_integrity, subresource_integrity
+
+PATH = "vendor/example-1.0/example.css"
+
+
+def test_matching_download_passes():
+    check_integrity(PATH, b"body{}", {PATH: subresource_integrity(b"body{}")})
+
+
+@pytest.mark.parametrize("pins", [{}, {PATH: subresource_integrity(b"body{}")}])
+def test_unpinned_or_tampered_download_is_rejected(pins):
+    with pytest.raises(RuntimeError):
+        check_integrity(PATH, b"body{color:red}", pins)
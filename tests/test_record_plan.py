@@ -0,0 +1,45 @@
+import asyncio
+
+from cache import DomainListEntry
+from models import DesiredRecordSet, DNSRecordCreate, DynuAPI, RecordPlanRequest
+from record_plan import CREATE, UPDATE, build_plan, diff_records
+
+
+def txt(record_id, value, name=""):
+    return {"id": record_id, "recordType": "TXT", "nodeName": name, "textData": value, "ttl": 120, "state": True}
+
+
+def test_changed_value_becomes_update_when_pruning():
+    current = [txt(5, "old")]
+    changes, unchanged = diff_records(1, "example.com", current, [txt(None, "new")], {"TXT"}, prune=True)
+    assert [(c.action, c.record_id) for c in changes] == [(UPDATE, 5)]
+    assert unchanged == 0
+
+
+def test_existing_records_are_left_alone_without_pruning():
+    current = [txt(5, "google-site-verification=abc")]
+    desired = [{k: v for k, v in txt(None, "v=spf1 -all").items() if k != "id"}]
+    changes, unchanged = diff_records(1, "example.com", current, desired, {"TXT"}, prune=False)
+    assert [(c.action, c.record_id) for c in changes] == [(CREATE, None)]
+    assert changes[0].data["textData"] == "v=spf1 -all"
+
+
+def test_zero_priority_matches_existing_record(monkeypatch):
+    dynu_api = DynuAPI("test-key")
+    current = [{"id": 7, "recordType": "MX", "nodeName": "", "host": "mx.example.com", "priority": 0, "ttl": 120, "state": True}]
+
+    async def domain_list():
+        return DomainListEntry([{"id": 1, "name": "example.com"}], version=1)
+
+    async def load_domain_records(domain_id):
+        return current
+
+    monkeypatch.setattr(dynu_api, "domain_list", domain_list)
+    monkeypatch.setattr(dynu_api, "load_domain_records", load_domain_records)
+    spec = RecordPlanRequest(sets=[DesiredRecordSet(
+        domain_names=["example.com"],
+        records=[DNSRecordCreate(record_type="MX", name="@", value="mx.example.com", priority=0)],
+    )])
+    plan = asyncio.run(build_plan(dynu_api, spec))
+    assert plan.changes == []
+    assert plan.unchanged == 1
@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from routes import decode_cursor, encode_cursor, etag_matches
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(500, 1234)) == (500, 1234)
+
+
+@pytest.mark.parametrize("cursor", [encode_cursor(-3, None), "not-a-cursor", encode_cursor("x", None)])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("header, matches", [
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"other", W/"abc"', True),
+    ("*", True),
+    ('"other"', False),
+])
+def test_etag_matches_weakly(header, matches):
+    request = SimpleNamespace(headers={"if-none-match": header})
+    assert etag_matches(request, 'W/"abc"') is matches
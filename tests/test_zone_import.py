@@ -0,0 +1,51 @@
+import asyncio
+import gzip
+import io
+import zipfile
+
+import pytest
+
+from bulk_operations import FAILED
+from cache import DomainListEntry
+from models import DynuAPI
+from zone_import import import_zones, zone_sources
+
+ZONE = "$ORIGIN example.com.\n" + "".join(f"host{i} IN A 192.0.2.{i % 250}\n" for i in range(2000))
+
+
+def corrupt_gzip() -> bytes:
+    data = bytearray(gzip.compress(ZONE.encode()))
+    for i in range(40, 80):
+        data[i] ^= 0xFF
+    return bytes(data)
+
+
+def corrupt_zip() -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("example.com.zone", ZONE)
+    data = bytearray(buffer.getvalue())
+    for i in range(60, 100):
+        data[i] ^= 0xFF
+    return bytes(data)
+
+
+@pytest.mark.parametrize("filename, data", [
+    ("example.com.zone.gz", corrupt_gzip()),
+    ("zones.zip", corrupt_zip()),
+    ("zones.zip", b"not a zip file"),
+])
+def test_corrupt_archive_becomes_report_entry(monkeypatch, filename, data):
+    dynu_api = DynuAPI("test-key")
+
+    async def domain_list():
+        return DomainListEntry([{"id": 1, "name": "example.com"}], version=1)
+
+    async def load_domain_records(domain_id):
+        return []
+
+    monkeypatch.setattr(dynu_api, "domain_list", domain_list)
+    monkeypatch.setattr(dynu_api, "load_domain_records", load_domain_records)
+    report = asyncio.run(import_zones(dynu_api, zone_sources(filename, io.BytesIO(data)), dry_run=True))
+    assert report.counts.get(FAILED, 0) >= 1
+    assert any((line["error"] or "").startswith("Could not read file") for line in report.lines)
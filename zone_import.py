@@ -0,0 +1,456 @@
+import asyncio
+import codecs
+import gzip
+import itertools
+import lzma
+import os
+import re
+import tarfile
+import time
+import zipfile
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, IO, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from bulk_operations import (
+    CREATED, EXISTS, FAILED, SESSION_ERROR_LENGTH, SESSION_ITEM_LENGTH, SESSION_REPORT_LIMIT,
+    account_semaphore, fit_session_report,
+)
+from models import DynuAPI
+from record_plan import identity
+
+SKIPPED = "skipped"
+PLANNED = "would create"  # Dry run
+
+SUPPORTED_TYPES = {"A", "TXT", "MX", "SPF"}
+CLASSES = {"IN", "CH", "HS", "CS"}
+DEFAULT_TTL = 3600
+
+# Memory bounds: one zone entry (parenthesised lines included), records in flight, lines kept in the report
+MAX_ENTRY_LENGTH = 65536
+BATCH_SIZE = 500
+MAX_REPORTED_LINES = 1000
+# Entries read and parsed per trip to a worker thread (decompressing and parsing would block the event loop)
+PARSE_CHUNK_SIZE = 200
+
+# Corrupt or unsupported uploads: zlib/lzma raise on damaged compressed data, zipfile raises
+# NotImplementedError for compression methods it cannot read
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, OSError, EOFError, zlib.error, lzma.LZMAError, NotImplementedError)
+_TTL = re.compile(r"^(\d+[smhdw]?)+$", re.IGNORECASE)
+_TTL_PART = re.compile(r"(\d+)([smhdw]?)", re.IGNORECASE)
+_TTL_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_ZONE_FILE_PREFIXES = ("db.",)
+_ZONE_FILE_SUFFIXES = (".zone", ".db", ".txt", ".hosts")
+
+
+class Token(NamedTuple):
+    text: str
+    quoted: bool
+
+
+class RawEntry(NamedTuple):
+    line: int
+    same_owner: bool  # Line started with blank space: the owner of the previous record
+    tokens: List[Token]
+    error: Optional[str]
+
+
+@dataclass
+class ZoneEntry:
+    source: str  # file:line
+    owner: str = ""  # Absolute name, lower case, no trailing dot
+    ttl: int = DEFAULT_TTL
+    record_type: str = ""
+    value: str = ""
+    priority: int = 10
+    error: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.record_type} {self.owner} {self.value}".strip()
+
+
+def _unescape(text: str) -> str:
+    """Resolve RFC 1035 escapes (\\X and \\DDD) in a character string"""
+    if "\\" not in text:
+        return text
+    out, i = [], 0
+    while i < len(text):
+        if text[i] == "\\" and i + 1 < len(text):
+            if text[i + 1:i + 4].isdigit() and len(text[i + 1:i + 4]) == 3:
+                out.append(chr(int(text[i + 1:i + 4])))
+                i += 4
+            else:
+                out.append(text[i + 1])
+                i += 2
+        else:
+            out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+def raw_entries(lines: Iterable[Optional[str]]) -> Iterator[RawEntry]:
+    """Split zone file lines into entries, joining parenthesised continuations and dropping comments.
+
+    A None line stands for a line that was too long to read.
+    """
+    depth, tokens, start, same_owner, size, broken = 0, [], 0, False, 0, None
+    line_no = 0
+    for line_no, line in enumerate(lines, 1):
+        if depth == 0:
+            tokens, start, size, broken = [], line_no, 0, None
+            same_owner = bool(line) and line[:1] in (" ", "\t")
+        if line is None:
+            broken = broken or "Line too long"
+            line = ""
+        size += len(line)
+        if size > MAX_ENTRY_LENGTH:
+            broken = broken or "Entry too long"
+            line = ""
+        i, n = 0, len(line)
+        while i < n and not broken:
+            ch = line[i]
+            if ch in " \t\r\n":
+                i += 1
+            elif ch == ";":
+                break
+            elif ch == "(":
+                depth += 1
+                i += 1
+            elif ch == ")":
+                if depth == 0:
+                    broken = "Unbalanced ')'"
+                depth = max(0, depth - 1)
+                i += 1
+            elif ch == '"':
+                j = i + 1
+                while j < n and line[j] != '"':
+                    j += 2 if line[j] == "\\" else 1
+                if j >= n:
+                    broken = "Unterminated quoted string"
+                    break
+                tokens.append(Token(_unescape(line[i + 1:j]), True))
+                i = j + 1
+            else:
+                j = i
+                while j < n and line[j] not in ' \t\r\n;()"':
+                    j += 2 if line[j] == "\\" else 1
+                tokens.append(Token(_unescape(line[i:j]), False))
+                i = j
+        if broken:
+            depth = 0  # Give up on this entry and resynchronise on the next line
+        if depth == 0 and (tokens or broken):
+            yield RawEntry(start, same_owner, tokens, broken)
+            tokens, broken = [], None
+    if depth:
+        yield RawEntry(start, same_owner, tokens, "Unclosed '(' at end of file")
+
+
+def parse_ttl(text: str) -> Optional[int]:
+    """Seconds for a TTL such as 3600 or 1h30m, None if the text is not a TTL"""
+    if not _TTL.match(text):
+        return None
+    return sum(int(number) * _TTL_UNITS[unit.lower()] for number, unit in _TTL_PART.findall(text))
+
+
+def absolute_name(name: str, origin: Optional[str]) -> str:
+    if name == "@":
+        if origin is None:
+            raise ValueError("'@' used before $ORIGIN")
+        return origin
+    if name.endswith("."):
+        return name[:-1].lower()
+    if origin is None:
+        raise ValueError(f"Relative name '{name}' without $ORIGIN")
+    return f"{name}.{origin}".lower()
+
+
+def origin_from_filename(path: str) -> Optional[str]:
+    """example.com.zone or db.example.com -> example.com (None if the name does not look like a zone)"""
+    name = os.path.basename(path).lower()
+    for prefix in _ZONE_FILE_PREFIXES:
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+    for suffix in _ZONE_FILE_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name.rstrip(".") if "." in name else None
+
+
+def parse_zone(lines: Iterable[Optional[str]], source: str, origin: Optional[str] = None) -> Iterator[ZoneEntry]:
+    """Stream the records of one zone file; entries that cannot be read carry an error"""
+    origin = origin.rstrip(".").lower() if origin else origin_from_filename(source)
+    default_ttl: Optional[int] = None
+    last_ttl: Optional[int] = None
+    last_owner: Optional[str] = None
+    for raw in raw_entries(lines):
+        where = f"{source}:{raw.line}"
+        if raw.error:
+            yield ZoneEntry(where, error=raw.error)
+            continue
+        tokens = raw.tokens
+        try:
+            if not tokens[0].quoted and tokens[0].text.startswith("$"):
+                directive = tokens[0].text.upper()
+                if directive == "$ORIGIN" and len(tokens) > 1:
+                    origin = absolute_name(tokens[1].text, origin)
+                elif directive == "$TTL" and len(tokens) > 1 and parse_ttl(tokens[1].text) is not None:
+                    default_ttl = parse_ttl(tokens[1].text)
+                else:
+                    yield ZoneEntry(where, error=f"Unsupported directive {' '.join(t.text for t in tokens[:2])}")
+                continue
+            if raw.same_owner:
+                if last_owner is None:
+                    raise ValueError("Record without an owner name")
+                owner, rest = last_owner, tokens
+            else:
+                owner, rest = absolute_name(tokens[0].text, origin), tokens[1:]
+            ttl = None
+            # TTL and class may come in either order, both optional
+            while len(rest) > 1 and not rest[0].quoted:
+                if rest[0].text.upper() in CLASSES:
+                    rest = rest[1:]
+                elif ttl is None and parse_ttl(rest[0].text) is not None:
+                    ttl = parse_ttl(rest[0].text)
+                    rest = rest[1:]
+                else:
+                    break
+            if not rest:
+                raise ValueError("Missing record type")
+            if ttl is None:
+                ttl = default_ttl if default_ttl is not None else last_ttl if last_ttl is not None else DEFAULT_TTL
+            last_owner, last_ttl = owner, ttl
+            record_type, rdata = rest[0].text.upper(), rest[1:]
+            entry = ZoneEntry(where, owner, ttl, record_type)
+            if record_type == "A":
+                if len(rdata) != 1:
+                    raise ValueError("A record needs exactly one address")
+                entry.value = rdata[0].text
+            elif record_type in ("TXT", "SPF"):
+                if not rdata:
+                    raise ValueError(f"{record_type} record without text")
+                # Several character strings form one text value
+                entry.value = "".join(t.text for t in rdata)
+            elif record_type == "MX":
+                if len(rdata) != 2 or not rdata[0].text.isdigit():
+                    raise ValueError("MX record needs a preference and a host")
+                entry.priority = int(rdata[0].text)
+                entry.value = absolute_name(rdata[1].text, origin)
+            else:
+                entry.value = " ".join(t.text for t in rdata)
+            yield entry
+        except ValueError as e:
+            yield ZoneEntry(where, error=str(e))
+
+
+def _text_lines(stream: IO[bytes], chunk_size: int = 65536) -> Iterator[Optional[str]]:
+    """Decode a byte stream line by line, never holding more than one bounded line.
+
+    Overlong lines come out as None. Works on any .read() stream (tar
+    stream-mode members are not seekable, which TextIOWrapper needs).
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer, overlong = "", False
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += decoder.decode(chunk, final=not chunk)
+        parts = buffer.split("\n")
+        buffer = parts.pop()
+        for part in parts:
+            if overlong:
+                overlong = False
+                yield None
+            else:
+                yield part + "\n"
+        if len(buffer) > MAX_ENTRY_LENGTH:
+            buffer, overlong = "", True
+        if not chunk:
+            if overlong:
+                yield None
+            elif buffer:
+                yield buffer
+            return
+
+
+def zone_sources(filename: str, fileobj: IO[bytes]) -> Iterator[Tuple[str, Iterator[Optional[str]]]]:
+    """(file name, lines) of each zone file in an upload; zip and tar archives are read member by member"""
+    lower = filename.lower()
+    if lower.endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, _text_lines(member)
+    elif lower.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")):
+        # Stream mode: members are read in order and never seeked back to
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for member in archive:
+                if member.isfile():
+                    yield member.name, _text_lines(archive.extractfile(member))
+    elif lower.endswith(".gz"):
+        yield filename[:-3], _text_lines(gzip.GzipFile(fileobj=fileobj))
+    else:
+        yield filename, _text_lines(fileobj)
+
+
+@dataclass
+class ImportReport:
+    dry_run: bool = False
+    files: int = 0
+    counts: Dict[str, int] = field(default_factory=dict)
+    lines: List[Dict[str, Any]] = field(default_factory=list)
+    hidden: int = 0
+    elapsed: float = 0.0
+
+    def add(self, source: str, status: str, error: Optional[str] = None, record: str = ""):
+        self.counts[status] = self.counts.get(status, 0) + 1
+        # Created/existing records are only counted; everything else is listed per line
+        if status in (CREATED, EXISTS):
+            return
+        if len(self.lines) < MAX_REPORTED_LINES:
+            self.lines.append({"line": source, "status": status, "error": error, "record": record})
+        else:
+            self.hidden += 1
+
+    @property
+    def action(self) -> str:
+        return "zone import (dry run)" if self.dry_run else "zone import"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "action": self.action,
+            "dry_run": self.dry_run,
+            "files": self.files,
+            "counts": self.counts,
+            "elapsed": round(self.elapsed, 3),
+            "lines": self.lines,
+            "hidden": self.hidden,
+        }
+
+    def to_session(self, limit: int = SESSION_REPORT_LIMIT) -> Dict[str, Any]:
+        """Same shape and size cap as BulkResult.to_session, so the domains page shows it as a bulk report"""
+        order = {FAILED: 0, SKIPPED: 1}
+        ranked = sorted(self.lines, key=lambda line: order.get(line["status"], 2))
+        return fit_session_report({
+            "action": self.action,
+            "counts": self.counts,
+            "items": [
+                {"item": f"{line['line']} {line['record']}".strip()[:SESSION_ITEM_LENGTH], "status": line["status"],
+                 "error": (line["error"] or "")[:SESSION_ERROR_LENGTH]}
+                for line in ranked[:limit]
+            ],
+            "hidden": max(0, len(self.lines) - limit) + self.hidden,
+        })
+
+
+def _read_entries(sources: Iterator[Tuple[str, Iterable[Optional[str]]]], origin: Optional[str],
+                  report: ImportReport) -> Iterator[ZoneEntry]:
+    """Entries of every zone file in turn; an unreadable archive ends the stream with a failed entry"""
+    current = "upload"
+    try:
+        for current, lines in sources:
+            report.files += 1
+            yield from parse_zone(lines, current, origin)
+    except ARCHIVE_ERRORS as e:
+        yield ZoneEntry(current, error=f"Could not read file: {e}")
+
+
+def _next_chunk(entries: Iterator[ZoneEntry]) -> List[ZoneEntry]:
+    return list(itertools.islice(entries, PARSE_CHUNK_SIZE))
+
+
+def _split_owner(owner: str, domains: Dict[str, int]) -> Optional[Tuple[int, str]]:
+    """(domain id, node name) for the longest account domain the owner belongs to"""
+    labels = owner.split(".")
+    for i in range(len(labels)):
+        domain_id = domains.get(".".join(labels[i:]))
+        if domain_id is not None:
+            return domain_id, ".".join(labels[:i])
+    return None
+
+
+async def import_zones(dynu_api: DynuAPI, sources: Iterator[Tuple[str, Iterable[Optional[str]]]],
+                       origin: Optional[str] = None, dry_run: bool = False) -> ImportReport:
+    """Add the A, TXT, MX and SPF records of zone files to the account's matching domains.
+
+    Files are read and parsed in a worker thread and records go out in
+    batches of BATCH_SIZE under the account-wide cap, so a large archive
+    neither blocks the event loop nor is held in memory. Records a domain already has are
+    reported as existing and not added again; dry_run stops before any write.
+    """
+    started = time.perf_counter()
+    report = ImportReport(dry_run=dry_run)
+    entry = await dynu_api.domain_list()
+    domains = {(d.get("name") or "").lower(): d.get("id") for d in (entry.domains if entry else [])}
+    known: Dict[int, Optional[set]] = {}  # domain id -> identities of its records (None: could not load)
+    semaphore = account_semaphore(dynu_api.api_key)
+    pending: List[Tuple[ZoneEntry, int, dict]] = []
+
+    async def existing(domain_id: int) -> Optional[set]:
+        if domain_id not in known:
+            async with semaphore:
+                records = await dynu_api.load_domain_records(domain_id)
+            known[domain_id] = {identity(r) for r in records} if records is not None else None
+        return known[domain_id]
+
+    async def add_one(zone_entry: ZoneEntry, domain_id: int, data: dict) -> Tuple[str, Optional[str]]:
+        async with semaphore:
+            success, error = await dynu_api.create_dns_record(domain_id, data)
+        return (CREATED, None) if success else (FAILED, error)
+
+    async def flush():
+        batch = pending[:]
+        pending.clear()
+        results = await asyncio.gather(*(add_one(*item) for item in batch), return_exceptions=True)
+        for (zone_entry, _, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                result = (FAILED, f"{type(result).__name__}: {result}")
+            report.add(zone_entry.source, result[0], result[1], zone_entry.label)
+
+    async def handle(zone_entry: ZoneEntry):
+        if zone_entry.error:
+            report.add(zone_entry.source, FAILED, zone_entry.error)
+            return
+        if zone_entry.record_type not in SUPPORTED_TYPES:
+            report.add(zone_entry.source, SKIPPED, f"{zone_entry.record_type} records are not imported", zone_entry.label)
+            return
+        target = _split_owner(zone_entry.owner, domains)
+        if target is None:
+            report.add(zone_entry.source, FAILED, f"No domain in this account for {zone_entry.owner}", zone_entry.label)
+            return
+        domain_id, node = target
+        data = dynu_api.record_data(zone_entry.record_type, node or "@", zone_entry.value,
+                                    zone_entry.priority, zone_entry.ttl)
+        if data["nodeName"] != node:
+            report.add(zone_entry.source, FAILED, f"Node name '{node}' is not accepted for {zone_entry.record_type} records",
+                       zone_entry.label)
+            return
+        identities = await existing(domain_id)
+        if identities is None:
+            report.add(zone_entry.source, FAILED, "Could not load the domain's current records", zone_entry.label)
+            return
+        if identity(data) in identities:
+            report.add(zone_entry.source, EXISTS, None, zone_entry.label)
+            return
+        identities.add(identity(data))  # Repeated lines are only added once
+        if dry_run:
+            report.add(zone_entry.source, PLANNED, None, zone_entry.label)
+            return
+        pending.append((zone_entry, domain_id, data))
+        if len(pending) >= BATCH_SIZE:
+            await flush()
+
+    loop = asyncio.get_running_loop()
+    entries = _read_entries(sources, origin, report)
+    try:
+        while True:
+            chunk = await loop.run_in_executor(None, _next_chunk, entries)
+            if not chunk:
+                break
+            for zone_entry in chunk:
+                await handle(zone_entry)
+    finally:
+        entries.close()
+    await flush()
+    report.elapsed = time.perf_counter() - started
+    return report